@@ -47,6 +47,14 @@ class Settings(BaseSettings):
     # Redis for job queue
     REDIS_URL: str = "redis://redis-service:6379/0"
 
+    # Background workers syncing NGSI-LD notifications to Odoo
+    SYNC_WORKERS: int = 4
+    SYNC_MAX_ATTEMPTS: int = 5
+    # Seconds before another replica may take over an unfinished inbox item
+    SYNC_LEASE_SECONDS: int = 300
+    # Seconds between scans of the inbox for failed and abandoned items
+    SYNC_RETRY_INTERVAL: int = 30
+
     # Keycloak
     KEYCLOAK_URL: str = "http://keycloak:8080/auth"
     KEYCLOAK_REALM: str = "nekazari"
@@ -64,6 +72,10 @@ class Settings(BaseSettings):
     N8N_URL: str = "http://n8n-service:5678"
     N8N_WEBHOOK_SECRET: str = ""
 
+    # Shared secret signing webhooks from the Odoo connector
+    # (X-Nekazari-Signature: sha256=<hex HMAC of the body>)
+    ODOO_WEBHOOK_SECRET: str = ""
+
     # Intelligence Module
     INTELLIGENCE_API_URL: str = "http://intelligence-api-service:8000"
 
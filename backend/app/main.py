@@ -8,14 +8,17 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+import orjson
 
 from app.config import settings
 from app.routers import tenant, sync, webhook, health, lifecycle
-from app.middleware.auth import JWTAuthMiddleware
+from app.middleware.auth import verify_jwt, prewarm_jwks
 
 # Configure logging
 logging.basicConfig(
@@ -30,17 +33,29 @@ async def lifespan(app: FastAPI):
     """Application lifespan events."""
     # Startup
     logger.info("Starting Nekazari Odoo ERP Module API")
-    logger.info(f"Odoo URL: {settings.odoo_url}")
-    logger.info(f"Orion-LD URL: {settings.ORION_URL}")
+    logger.info("Odoo URL: %s", settings.odoo_url)
+    logger.info("Orion-LD URL: %s", settings.ORION_URL)
 
-    # Initialize database tables if needed
-    from app.services.database import init_db
-    await init_db()
+    # Create the database pool once, before anything queries it
+    from app.services.database import init_pool, init_db, close_pool
+    await init_pool()
+
+    # Initialize database tables and fetch JWKS concurrently, so the first
+    # authenticated request doesn't pay for the Keycloak round-trip
+    await asyncio.gather(init_db(), prewarm_jwks())
+
+    # Start background workers for NGSI-LD notification syncs
+    from app.services.sync_queue import start_sync_workers, stop_sync_workers
+    await start_sync_workers()
 
     yield
 
     # Shutdown
     logger.info("Shutting down Nekazari Odoo ERP Module API")
+    await stop_sync_workers()
+    from app.services.http_client import close_http_client
+    await close_http_client()
+    await close_pool()
 
 
 app = FastAPI(
@@ -64,15 +79,12 @@ app = FastAPI(
     **Company**: Robotika
     """,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None
 )
 
-# JWT Auth Middleware (validates tokens from Keycloak)
-# Added FIRST so it runs AFTER CORS (middleware stack is LIFO)
-app.add_middleware(JWTAuthMiddleware)
-
-# CORS Middleware - Added LAST so it processes ALL responses (including auth errors)
+# CORS Middleware - processes ALL responses (including auth errors)
 # This ensures CORS headers are added to 401/403 responses
 app.add_middleware(
     CORSMiddleware,
@@ -84,19 +96,36 @@ app.add_middleware(
 )
 
 # Include routers
+# JWT auth (Keycloak) is a dependency on the routers that need it; health,
+# webhook and lifecycle endpoints are public or validated by their own secrets
+# (individual routes that still need a token declare the dependency themselves)
 app.include_router(health.router, prefix="/api/odoo", tags=["Health"])
-app.include_router(tenant.router, prefix="/api/odoo/tenant", tags=["Tenant Management"])
-app.include_router(sync.router, prefix="/api/odoo/sync", tags=["Synchronization"])
+app.include_router(
+    tenant.router,
+    prefix="/api/odoo/tenant",
+    tags=["Tenant Management"],
+    dependencies=[Depends(verify_jwt)]
+)
+app.include_router(
+    sync.router,
+    prefix="/api/odoo/sync",
+    tags=["Synchronization"],
+    dependencies=[Depends(verify_jwt)]
+)
 app.include_router(webhook.router, prefix="/api/odoo/webhook", tags=["Webhooks"])
 app.include_router(lifecycle.router, prefix="/api/odoo", tags=["Lifecycle"])
 
 
+# Root payload never changes at runtime; serialize it once
+_ROOT_BYTES = orjson.dumps({
+    "service": "Nekazari Odoo ERP Module",
+    "version": settings.API_VERSION,
+    "author": "Kate Benetis <kate@robotika.cloud>",
+    "company": "Robotika"
+})
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
-    return {
-        "service": "Nekazari Odoo ERP Module",
-        "version": settings.API_VERSION,
-        "author": "Kate Benetis <kate@robotika.cloud>",
-        "company": "Robotika"
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
@@ -1,21 +1,23 @@
 """
-Nekazari Odoo ERP Module - JWT Authentication Middleware
+Nekazari Odoo ERP Module - JWT Authentication
 
-Validates JWT tokens from Keycloak.
+Validates JWT tokens from Keycloak. Applied as a FastAPI dependency on
+the routers that need it, so public endpoints never run auth code.
 
 Author: Kate Benetis <kate@robotika.cloud>
 Company: Robotika
 License: AGPL-3.0
 """
 
+import hashlib
 import logging
+import time
 from typing import Optional
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+from fastapi import Depends, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 import jwt
 from jwt import PyJWKClient
-import httpx
+from cachetools import TTLCache
 
 from app.config import settings
 
@@ -24,140 +26,134 @@ logger = logging.getLogger(__name__)
 # Cache for JWKS client
 _jwks_client: Optional[PyJWKClient] = None
 
+# Cache of validated token payloads, keyed by a digest of the raw token.
+# Only touched from the event loop, so no locking is needed.
+_token_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+
+# Shared empty mapping for claim lookups (never mutated)
+_EMPTY: dict = {}
+
+_EXPECTED_ISSUER = f"{settings.KEYCLOAK_URL}/realms/{settings.KEYCLOAK_REALM}"
+
+# Keycloak tokens may not include 'aud' claim depending on configuration.
+# Validate signature and issuer, skip audience validation, and require
+# exp/iss to be present so they are enforced in the single decode.
+_DECODE_KWARGS = {
+    "algorithms": ["RS256"],
+    "issuer": _EXPECTED_ISSUER,
+    "options": {"verify_aud": False, "require": ["exp", "iss"]}
+}
+
+
+def _token_cache_key(token: str) -> bytes:
+    """Digest a token so raw JWTs are not retained in memory."""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 
 def get_jwks_client() -> PyJWKClient:
     """Get or create JWKS client for token validation."""
     global _jwks_client
     if _jwks_client is None:
-        _jwks_client = PyJWKClient(settings.jwks_url)
+        # Cache the JWK set and resolved signing keys so Keycloak's certs
+        # endpoint is only hit on expiry or key rotation
+        _jwks_client = PyJWKClient(
+            settings.jwks_url,
+            cache_jwk_set=True,
+            cache_keys=True,
+            lifespan=3600,
+            max_cached_keys=16
+        )
     return _jwks_client
 
 
-class JWTAuthMiddleware(BaseHTTPMiddleware):
-    """Middleware to validate JWT tokens from Keycloak."""
-
-    # Paths that don't require authentication
-    EXEMPT_PATHS = {
-        "/",
-        "/api/odoo/health",
-        "/api/odoo/webhook/ngsi",  # NGSI-LD subscriptions (validated differently)
-        "/api/odoo/webhook/n8n",   # N8N webhooks (validated by secret)
-        "/api/odoo/internal/lifecycle",  # Module lifecycle (validated by HMAC)
-        "/docs",
-        "/redoc",
-        "/openapi.json"
-    }
-
-    async def dispatch(self, request: Request, call_next):
-        """Process the request and validate JWT if needed."""
-
-        # Skip auth for exempt paths
-        if request.url.path in self.EXEMPT_PATHS:
-            return await call_next(request)
-
-        # Skip auth for OPTIONS requests (CORS preflight)
-        if request.method == "OPTIONS":
-            return await call_next(request)
-
-        # Extract token from Authorization header or httpOnly cookie fallback
-        token = None
-        auth_header = request.headers.get("Authorization")
-        if auth_header:
-            try:
-                scheme, token = auth_header.split()
-                if scheme.lower() != "bearer":
-                    token = None
-            except ValueError:
-                token = None
-
-        if not token:
-            token = request.cookies.get("nkz_token")
-
-        if not token:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Missing authentication (Bearer token or session cookie)"}
-            )
-
-        # Validate token
-        try:
-            payload = await self.validate_token(token)
-            request.state.user = payload
-            request.state.tenant_id = self.extract_tenant_id(request, payload)
-        except jwt.ExpiredSignatureError:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Token has expired"}
-            )
-        except jwt.InvalidTokenError as e:
-            logger.warning(f"Invalid token: {e}")
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Invalid token"}
-            )
-        except Exception as e:
-            logger.error(f"Auth error: {e}")
-            return JSONResponse(
-                status_code=500,
-                content={"detail": "Authentication error"}
-            )
-
-        return await call_next(request)
-
-    async def validate_token(self, token: str) -> dict:
-        """Validate JWT token and return payload."""
-        try:
-            jwks_client = get_jwks_client()
-            signing_key = jwks_client.get_signing_key_from_jwt(token)
-            
-            expected_issuer = f"{settings.KEYCLOAK_URL}/realms/{settings.KEYCLOAK_REALM}"
-
-            # Keycloak tokens may not include 'aud' claim depending on configuration
-            # Validate signature and issuer, skip audience validation
-            payload = jwt.decode(
-                token,
-                signing_key.key,
-                algorithms=["RS256"],
-                issuer=expected_issuer,
-                options={"verify_aud": False}
-            )
-            
-            logger.debug(f"Token validated for user: {payload.get('preferred_username', 'unknown')}")
-            return payload
-
-        except jwt.PyJWKClientError as e:
-            logger.error(f"JWKS client error: {e}")
-            raise jwt.InvalidTokenError("Could not validate token")
-
-    def extract_tenant_id(self, request: Request, payload: dict) -> Optional[str]:
-        """Extract tenant ID from request or token."""
-        # First try X-Tenant-ID header
-        tenant_id = request.headers.get("X-Tenant-ID")
-        if tenant_id:
-            return tenant_id
-
-        # Try to get from token claims
-        # Keycloak can include tenant in resource_access or custom claims
-        resource_access = payload.get("resource_access", {})
-        nekazari_access = resource_access.get("nekazari-api", {})
-        tenant_id = nekazari_access.get("tenant_id")
-
-        if tenant_id:
-            return tenant_id
-
-        # Try custom claim
-        return payload.get("tenant_id")
-
-
-def get_current_user(request: Request) -> dict:
-    """Dependency to get current user from request state."""
-    user = getattr(request.state, "user", None)
-    if not user:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+async def prewarm_jwks():
+    """Fetch and cache Keycloak's signing keys before the first request."""
+    try:
+        await run_in_threadpool(get_jwks_client().get_signing_keys)
+        logger.info("JWKS prewarmed")
+    except Exception as e:
+        # Not fatal: keys are fetched lazily on the first authenticated request
+        logger.warning("JWKS prewarm failed: %s", e)
+
+
+def _parse_bearer(auth_header: Optional[str]) -> Optional[str]:
+    """Return the token from a 'Bearer <token>' header, or None."""
+    if auth_header and auth_header[:7].lower() == "bearer ":
+        return auth_header[7:].strip() or None
+    return None
+
+
+async def validate_token(token: str) -> dict:
+    """Validate JWT token and return payload."""
+    cache_key = _token_cache_key(token)
+    cached = _token_cache.get(cache_key)
+    if cached is not None and cached.get("exp", 0) > time.time():
+        return cached
+
+    try:
+        jwks_client = get_jwks_client()
+        # Both calls block (JWKS fetch + RS256 verify); keep them off the event loop
+        signing_key = await run_in_threadpool(jwks_client.get_signing_key_from_jwt, token)
+        payload = await run_in_threadpool(
+            jwt.decode, token, signing_key.key, **_DECODE_KWARGS
+        )
+
+        logger.debug("Token validated for user: %s", payload.get('preferred_username', 'unknown'))
+        _token_cache[cache_key] = payload
+        return payload
+
+    except jwt.PyJWKClientError as e:
+        logger.error("JWKS client error: %s", e)
+        raise jwt.InvalidTokenError("Could not validate token")
+
+
+def extract_tenant_id(payload: dict) -> Optional[str]:
+    """Extract tenant ID from token claims (X-Tenant-ID header takes precedence)."""
+    # Keycloak can include tenant in resource_access or custom claims
+    return (
+        payload.get("resource_access", _EMPTY)
+        .get("nekazari-api", _EMPTY)
+        .get("tenant_id")
+        or payload.get("tenant_id")
+    )
+
+
+async def verify_jwt(request: Request) -> dict:
+    """Dependency that validates the JWT and stores user/tenant on request state."""
+    # Extract token from Authorization header or httpOnly cookie fallback
+    token = _parse_bearer(request.headers.get("Authorization"))
+    if not token:
+        token = request.cookies.get("nkz_token")
+
+    if not token:
+        raise HTTPException(
+            status_code=401,
+            detail="Missing authentication (Bearer token or session cookie)"
+        )
+
+    # Validate token
+    try:
+        payload = await validate_token(token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token has expired")
+    except jwt.InvalidTokenError as e:
+        logger.warning("Invalid token: %s", e)
+        raise HTTPException(status_code=401, detail="Invalid token")
+    except Exception as e:
+        logger.error("Auth error: %s", e)
+        raise HTTPException(status_code=500, detail="Authentication error")
+
+    request.state.user = payload
+    request.state.tenant_id = request.headers.get("X-Tenant-ID") or extract_tenant_id(payload)
+    return payload
+
+
+def get_current_user(user: dict = Depends(verify_jwt)) -> dict:
+    """Dependency to get current user from the validated token."""
     return user
 
 
-def get_current_tenant(request: Request) -> str:
+def get_current_tenant(request: Request, user: dict = Depends(verify_jwt)) -> str:
     """Dependency to get current tenant ID from request state."""
     tenant_id = getattr(request.state, "tenant_id", None)
     if not tenant_id:
@@ -6,15 +6,37 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+import asyncio
 import logging
-from fastapi import APIRouter
-import httpx
+from fastapi import APIRouter, Depends, Response
+import orjson
 
 from app.config import settings
+from app.middleware.auth import verify_jwt
+from app.services.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Placeholder stats are constant until real counts are wired in; serialize once
+_EMPTY_STATS_BYTES = orjson.dumps({
+    "products": 0,
+    "assets": 0,
+    "invoices": 0,
+    "energyInstallations": 0,
+    "pendingSync": 0
+})
+
+
+async def _probe(name: str, url: str) -> str:
+    """Probe a downstream service and return its health label."""
+    try:
+        response = await get_http_client().get(url, timeout=5.0)
+        return "healthy" if response.status_code == 200 else "unhealthy"
+    except Exception as e:
+        logger.warning("%s health check failed: %s", name, e)
+        return "unreachable"
+
 
 @router.get("/health")
 async def health_check():
@@ -29,23 +51,11 @@ async def health_check():
         "version": settings.API_VERSION
     }
 
-    # Check Odoo connection
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{settings.odoo_url}/web/health")
-            health_status["odoo"] = "healthy" if response.status_code == 200 else "unhealthy"
-    except Exception as e:
-        logger.warning(f"Odoo health check failed: {e}")
-        health_status["odoo"] = "unreachable"
-
-    # Check Orion-LD connection
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{settings.ORION_URL}/version")
-            health_status["orion_ld"] = "healthy" if response.status_code == 200 else "unhealthy"
-    except Exception as e:
-        logger.warning(f"Orion-LD health check failed: {e}")
-        health_status["orion_ld"] = "unreachable"
+    # Check Odoo and Orion-LD concurrently
+    health_status["odoo"], health_status["orion_ld"] = await asyncio.gather(
+        _probe("Odoo", f"{settings.odoo_url}/web/health"),
+        _probe("Orion-LD", f"{settings.ORION_URL}/version")
+    )
 
     # Overall status
     if health_status.get("odoo") != "healthy":
@@ -54,7 +64,7 @@ async def health_check():
     return health_status
 
 
-@router.get("/stats")
+@router.get("/stats", dependencies=[Depends(verify_jwt)])
 async def get_stats():
     """
     Get module statistics.
@@ -62,11 +72,5 @@ async def get_stats():
     Returns counts of various entities and sync status.
     """
     # This would query the database for actual stats
-    # For now, return placeholder
-    return {
-        "products": 0,
-        "assets": 0,
-        "invoices": 0,
-        "energyInstallations": 0,
-        "pendingSync": 0
-    }
+    # For now, return the precomputed placeholder
+    return Response(content=_EMPTY_STATS_BYTES, media_type="application/json")
@@ -21,7 +21,7 @@ from pydantic import BaseModel
 from typing import Optional
 
 from app.config import settings
-from app.services.odoo_client import OdooClient
+from app.services.odoo_client import get_odoo_client
 from app.services.database import get_tenant_odoo_info, save_tenant_odoo_info
 
 logger = logging.getLogger(__name__)
@@ -73,7 +73,7 @@ async def handle_lifecycle(request: Request):
     except Exception:
         raise HTTPException(status_code=400, detail="Malformed payload")
 
-    logger.info(f"[lifecycle] event={event.event} tenant={event.tenant_id}")
+    logger.info("[lifecycle] event=%s tenant=%s", event.event, event.tenant_id)
 
     if event.event == "module.enabled":
         return await _handle_enable(event)
@@ -94,11 +94,11 @@ async def _handle_enable(event: LifecycleEvent) -> dict:
         current_status = existing.get("status")
 
         if current_status == "active":
-            logger.info(f"[lifecycle] Tenant {tenant_id} already active — noop")
+            logger.info("[lifecycle] Tenant %s already active — noop", tenant_id)
             return {"status": "already_active", "database": db_name}
 
         if current_status == "inactive":
-            logger.info(f"[lifecycle] Reactivating tenant {tenant_id}")
+            logger.info("[lifecycle] Reactivating tenant %s", tenant_id)
             await save_tenant_odoo_info(tenant_id, {
                 "status": "active",
                 "database": existing.get("database") or db_name,
@@ -106,11 +106,11 @@ async def _handle_enable(event: LifecycleEvent) -> dict:
             return {"status": "reactivated", "database": db_name}
 
         if current_status == "provisioning":
-            logger.info(f"[lifecycle] Tenant {tenant_id} already provisioning — noop")
+            logger.info("[lifecycle] Tenant %s already provisioning — noop", tenant_id)
             return {"status": "provisioning", "database": db_name}
 
     # First-time provisioning
-    logger.info(f"[lifecycle] Provisioning new Odoo DB for tenant {tenant_id}")
+    logger.info("[lifecycle] Provisioning new Odoo DB for tenant %s", tenant_id)
     await save_tenant_odoo_info(tenant_id, {
         "status": "provisioning",
         "database": db_name,
@@ -118,11 +118,11 @@ async def _handle_enable(event: LifecycleEvent) -> dict:
     })
 
     try:
-        odoo = OdooClient()
+        odoo = get_odoo_client()
 
         # Duplicate template (skip if DB already exists from a previous partial attempt)
         if await odoo.database_exists(db_name):
-            logger.info(f"[lifecycle] DB {db_name} already exists — skipping clone")
+            logger.info("[lifecycle] DB %s already exists — skipping clone", db_name)
         else:
             await odoo.duplicate_database(
                 source_db=settings.ODOO_TEMPLATE_DB,
@@ -137,7 +137,7 @@ async def _handle_enable(event: LifecycleEvent) -> dict:
         try:
             await odoo.install_modules(db_name, energy_modules)
         except Exception as mod_err:
-            logger.warning(f"[lifecycle] Non-fatal: could not install energy extras: {mod_err}")
+            logger.warning("[lifecycle] Non-fatal: could not install energy extras: %s", mod_err)
 
         # Create admin user for tenant (from the Keycloak email)
         admin_email = event.user_email or f"admin@{tenant_id}.nkz"
@@ -149,7 +149,7 @@ async def _handle_enable(event: LifecycleEvent) -> dict:
                 is_admin=True,
             )
         except Exception as usr_err:
-            logger.warning(f"[lifecycle] Non-fatal: could not create admin user: {usr_err}")
+            logger.warning("[lifecycle] Non-fatal: could not create admin user: %s", usr_err)
 
         await save_tenant_odoo_info(tenant_id, {
             "name": tenant_id,
@@ -166,13 +166,13 @@ async def _handle_enable(event: LifecycleEvent) -> dict:
             from app.services.ngsi_sync import register_tenant_subscriptions
             await register_tenant_subscriptions(tenant_id)
         except Exception as sub_err:
-            logger.warning(f"[lifecycle] Non-fatal: NGSI-LD subscriptions failed: {sub_err}")
+            logger.warning("[lifecycle] Non-fatal: NGSI-LD subscriptions failed: %s", sub_err)
 
-        logger.info(f"[lifecycle] Provisioned {db_name} for tenant {tenant_id}")
+        logger.info("[lifecycle] Provisioned %s for tenant %s", db_name, tenant_id)
         return {"status": "provisioned", "database": db_name}
 
     except Exception as exc:
-        logger.error(f"[lifecycle] Provisioning failed for {tenant_id}: {exc}")
+        logger.error("[lifecycle] Provisioning failed for %s: %s", tenant_id, exc)
         await save_tenant_odoo_info(tenant_id, {
             "status": "error",
             "database": db_name,
@@ -187,11 +187,11 @@ async def _handle_disable(event: LifecycleEvent) -> dict:
     existing = await get_tenant_odoo_info(tenant_id)
 
     if not existing:
-        logger.info(f"[lifecycle] No Odoo DB for tenant {tenant_id} — nothing to disable")
+        logger.info("[lifecycle] No Odoo DB for tenant %s — nothing to disable", tenant_id)
         return {"status": "not_found"}
 
     db_name = existing.get("database") or f"nkz_odoo_{tenant_id}"
-    logger.info(f"[lifecycle] Deactivating tenant {tenant_id} (DB {db_name} preserved)")
+    logger.info("[lifecycle] Deactivating tenant %s (DB %s preserved)", tenant_id, db_name)
 
     await save_tenant_odoo_info(tenant_id, {
         "status": "inactive",
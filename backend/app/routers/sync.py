@@ -8,18 +8,22 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+import asyncio
 import logging
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
-
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, AsyncIterator
+from datetime import datetime, timezone
+import orjson
+
+from app.config import settings
 from app.middleware.auth import get_current_tenant, get_current_user
 from app.services.ngsi_sync import NgsildSyncService
+from app.services.intelligence_integration import start_prediction_sync
 from app.services.database import (
-    get_entity_mappings,
+    get_entity_mappings_page,
     get_entity_mapping_by_ngsi_id,
-    create_entity_mapping,
     get_sync_status as db_get_sync_status,
     update_sync_status
 )
@@ -27,9 +31,23 @@ from app.services.database import (
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Mappings fetched per database round-trip
+_MAPPINGS_PAGE_SIZE = 500
+
+# Odoo window actions used to open a record of each model in the web client
+_MODEL_TO_ACTION: dict[str, str] = {
+    "product.template": "product.product_template_action",
+    "maintenance.equipment": "maintenance.hr_equipment_action",
+    "res.partner": "base.action_partner_form",
+    "energy.installation": "energy_community.action_energy_installation",
+    "energy.meter": "energy_community.action_energy_meter"
+}
+
 
 class SyncResult(BaseModel):
     """Result of a sync operation."""
+    model_config = ConfigDict(frozen=True)
+
     success: bool
     entitiesSynced: int
     errors: list[str]
@@ -38,26 +56,119 @@ class SyncResult(BaseModel):
 
 class SyncStatus(BaseModel):
     """Current sync status."""
+    model_config = ConfigDict(frozen=True)
+
     status: str
     lastSync: Optional[str] = None
 
 
 class OdooEntity(BaseModel):
-    """Mapped Odoo entity."""
-    odooId: int
-    odooModel: str
-    odooName: str
-    ngsiLdId: str
-    ngsiLdType: str
-    lastSync: str
+    """Mapped Odoo entity (validates straight from odoo_entity_mappings rows)."""
+    model_config = ConfigDict(frozen=True, populate_by_name=True)
+
+    odooId: int = Field(validation_alias="odoo_id")
+    odooModel: str = Field(validation_alias="odoo_model")
+    odooName: str = Field(validation_alias="odoo_name")
+    ngsiLdId: str = Field(validation_alias="ngsi_id")
+    ngsiLdType: str = Field(validation_alias="ngsi_type")
+    lastSync: Optional[datetime] = Field(default=None, validation_alias="last_sync")
 
 
 class CreateFromNgsiRequest(BaseModel):
     """Request to create Odoo entity from NGSI-LD."""
+    model_config = ConfigDict(frozen=True)
+
     ngsiLdId: str
     ngsiLdType: str
 
 
+def _mapping_to_entity(mapping: dict) -> dict:
+    """Rename a mapping row to the OdooEntity API shape."""
+    return {
+        "odooId": mapping["odoo_id"],
+        "odooModel": mapping["odoo_model"],
+        "odooName": mapping["odoo_name"],
+        "ngsiLdId": mapping["ngsi_id"],
+        "ngsiLdType": mapping["ngsi_type"],
+        "lastSync": mapping["last_sync"]
+    }
+
+
+async def _stream_mappings(
+    tenant_id: str,
+    ngsi_type: Optional[str],
+    first_page: list[dict],
+    limit: Optional[int]
+) -> AsyncIterator[bytes]:
+    """
+    Yield the mappings as a JSON array, one element per chunk.
+
+    first_page is fetched before the response starts (so setup errors
+    still produce a 500); later pages are fetched as the client reads.
+    """
+    separator = b"["
+    page = first_page
+    remaining = limit
+    try:
+        while page:
+            for mapping in page:
+                yield separator + orjson.dumps(_mapping_to_entity(mapping))
+                separator = b","
+
+            page_size = _MAPPINGS_PAGE_SIZE
+            if remaining is not None:
+                remaining -= len(page)
+                if remaining <= 0:
+                    break
+                page_size = min(page_size, remaining)
+            if len(page) < _MAPPINGS_PAGE_SIZE:
+                break
+            page = await get_entity_mappings_page(
+                tenant_id,
+                ngsi_type,
+                after_id=page[-1]["id"],
+                limit=page_size
+            )
+    except Exception as e:
+        # Headers are already sent at this point; abort the stream
+        logger.error("Failed to stream mappings: %s", e)
+        raise
+
+    yield b"[]" if separator == b"[" else b"]"
+
+
+# Full syncs currently running, per tenant; concurrent triggers share one run
+_inflight_syncs: dict[str, asyncio.Task] = {}
+
+
+async def _run_full_sync(tenant_id: str) -> tuple[dict, datetime]:
+    """Run a full sync and record its status."""
+    sync_service = NgsildSyncService(tenant_id)
+    result = await sync_service.full_sync()
+    now = datetime.now(timezone.utc)
+
+    await update_sync_status(tenant_id, {
+        "status": "synced",
+        "last_sync": now,  # Pass datetime object, not string
+        "entities_synced": result["synced"],
+        "errors": result["errors"]
+    })
+
+    return result, now
+
+
+def _get_or_start_full_sync(tenant_id: str) -> asyncio.Task:
+    """Return the in-flight full sync for a tenant, starting one if needed."""
+    task = _inflight_syncs.get(tenant_id)
+    if task is None:
+        task = asyncio.create_task(_run_full_sync(tenant_id))
+        _inflight_syncs[tenant_id] = task
+        task.add_done_callback(lambda _: _inflight_syncs.pop(tenant_id, None))
+    else:
+        logger.info("Sync already running for tenant %s, joining it", tenant_id)
+    return task
+
+
 @router.post("/trigger", response_model=SyncResult)
 async def trigger_sync(
     tenant_id: str = Depends(get_current_tenant),
@@ -70,32 +181,42 @@ async def trigger_sync(
     1. Fetch all subscribed entities from Orion-LD
     2. Upsert corresponding records in Odoo
     3. Update sync mappings in database
+
+    Concurrent triggers for the same tenant share a single sync run.
     """
-    logger.info(f"Triggering sync for tenant: {tenant_id}")
+    logger.info("Triggering sync for tenant: %s", tenant_id)
 
     try:
-        sync_service = NgsildSyncService(tenant_id)
-        result = await sync_service.full_sync()
-
-        await update_sync_status(tenant_id, {
-            "status": "synced",
-            "last_sync": datetime.utcnow(),  # Pass datetime object, not string
-            "entities_synced": result["synced"],
-            "errors": result["errors"]
-        })
+        # Shield so a disconnecting client doesn't cancel the shared run
+        result, now = await asyncio.shield(_get_or_start_full_sync(tenant_id))
 
         return SyncResult(
             success=len(result["errors"]) == 0,
             entitiesSynced=result["synced"],
             errors=result["errors"],
-            timestamp=datetime.utcnow().isoformat()
+            timestamp=now.isoformat()
         )
 
     except Exception as e:
-        logger.error(f"Sync failed for tenant {tenant_id}: {e}")
+        logger.error("Sync failed for tenant %s: %s", tenant_id, e)
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
 
 
+@router.post("/predictions", status_code=202)
+async def trigger_prediction_sync(
+    tenant_id: str = Depends(get_current_tenant),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Start syncing Intelligence predictions to Odoo in the background.
+
+    Returns immediately with a job ID; failures are recorded in the
+    tenant's sync status errors.
+    """
+    logger.info("Triggering prediction sync for tenant: %s", tenant_id)
+    return {"status": "accepted", "jobId": start_prediction_sync(tenant_id)}
+
+
 @router.get("/status", response_model=SyncStatus)
 async def get_sync_status(
     tenant_id: str = Depends(get_current_tenant)
@@ -115,39 +236,38 @@ async def get_sync_status(
         )
 
     except Exception as e:
-        logger.error(f"Failed to get sync status: {e}")
+        logger.error("Failed to get sync status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get sync status")
 
 
 @router.get("/mappings", response_model=list[OdooEntity])
 async def get_mappings(
     type: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
     tenant_id: str = Depends(get_current_tenant)
 ):
     """
     Get entity mappings between NGSI-LD and Odoo.
 
-    Optionally filter by NGSI-LD entity type.
+    Optionally filter by NGSI-LD entity type. Rows are fetched page by page
+    and streamed as a chunked JSON array, so memory stays flat for tenants
+    with many mappings. All mappings are returned unless limit is given.
     """
     try:
-        mappings = await get_entity_mappings(tenant_id, ngsi_type=type)
-
-        return [
-            OdooEntity(
-                odooId=m["odoo_id"],
-                odooModel=m["odoo_model"],
-                odooName=m["odoo_name"],
-                ngsiLdId=m["ngsi_id"],
-                ngsiLdType=m["ngsi_type"],
-                lastSync=m["last_sync"]
-            )
-            for m in mappings
-        ]
-
+        first_page = await get_entity_mappings_page(
+            tenant_id, type, limit=min(_MAPPINGS_PAGE_SIZE, limit or _MAPPINGS_PAGE_SIZE)
+        )
     except Exception as e:
-        logger.error(f"Failed to get mappings: {e}")
+        logger.error("Failed to get mappings: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get mappings")
 
+    # Rows come straight from our own table, so per-item model validation
+    # is skipped; response_model is kept for the OpenAPI schema.
+    return StreamingResponse(
+        _stream_mappings(tenant_id, type, first_page, limit),
+        media_type="application/json"
+    )
+
 
 @router.get("/entity/by-ngsi/{ngsi_id}", response_model=Optional[OdooEntity])
 async def get_entity_by_ngsi_id(
@@ -161,17 +281,10 @@ async def get_entity_by_ngsi_id(
         if not mapping:
             return None
 
-        return OdooEntity(
-            odooId=mapping["odoo_id"],
-            odooModel=mapping["odoo_model"],
-            odooName=mapping["odoo_name"],
-            ngsiLdId=mapping["ngsi_id"],
-            ngsiLdType=mapping["ngsi_type"],
-            lastSync=mapping["last_sync"]
-        )
+        return OdooEntity.model_validate(mapping)
 
     except Exception as e:
-        logger.error(f"Failed to get entity mapping: {e}")
+        logger.error("Failed to get entity mapping: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get entity mapping")
 
 
@@ -187,7 +300,7 @@ async def create_entity_from_ngsi(
     Fetches the entity from Orion-LD and creates the corresponding
     record in Odoo.
     """
-    logger.info(f"Creating Odoo entity from NGSI-LD: {request.ngsiLdId}")
+    logger.info("Creating Odoo entity from NGSI-LD: %s", request.ngsiLdId)
 
     try:
         sync_service = NgsildSyncService(tenant_id)
@@ -198,18 +311,9 @@ async def create_entity_from_ngsi(
         if not entity:
             raise HTTPException(status_code=404, detail="NGSI-LD entity not found")
 
-        # Create in Odoo
+        # Create in Odoo (this also saves the mapping)
         odoo_entity = await sync_service.sync_entity_to_odoo(entity)
-
-        # Save mapping
-        await create_entity_mapping(tenant_id, {
-            "ngsi_id": request.ngsiLdId,
-            "ngsi_type": request.ngsiLdType,
-            "odoo_id": odoo_entity["id"],
-            "odoo_model": odoo_entity["model"],
-            "odoo_name": odoo_entity["name"],
-            "last_sync": datetime.utcnow().isoformat()
-        })
+        now = datetime.now(timezone.utc)
 
         return OdooEntity(
             odooId=odoo_entity["id"],
@@ -217,13 +321,13 @@ async def create_entity_from_ngsi(
             odooName=odoo_entity["name"],
             ngsiLdId=request.ngsiLdId,
             ngsiLdType=request.ngsiLdType,
-            lastSync=datetime.utcnow().isoformat()
+            lastSync=now
         )
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to create Odoo entity: {e}")
+        logger.error("Failed to create Odoo entity: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to create entity: {str(e)}")
 
 
@@ -236,15 +340,7 @@ async def get_odoo_entity_url(
     """Get URL to open an Odoo entity in the web interface."""
     # ODOO_URL empty = relative path (same origin). Set in env for separate Odoo subdomain.
     base_url = (settings.ODOO_URL or "").strip().rstrip("/")
-    model_to_action = {
-        "product.template": "product.product_template_action",
-        "maintenance.equipment": "maintenance.hr_equipment_action",
-        "res.partner": "base.action_partner_form",
-        "energy.installation": "energy_community.action_energy_installation",
-        "energy.meter": "energy_community.action_energy_meter"
-    }
-
-    action = model_to_action.get(odoo_model, "")
+    action = _MODEL_TO_ACTION.get(odoo_model, "")
 
     path = f"/web#id={odoo_id}&model={odoo_model}&action={action}&view_type=form"
     url = f"{base_url}{path}" if base_url else f"/odoo{path}"
@@ -10,14 +10,15 @@ License: AGPL-3.0
 """
 
 import logging
+from functools import lru_cache
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from datetime import datetime
 
 from app.config import settings
 from app.middleware.auth import get_current_tenant, get_current_user
-from app.services.odoo_client import OdooClient
+from app.services.odoo_client import get_odoo_client
 from app.services.database import get_tenant_odoo_info, save_tenant_odoo_info
 
 logger = logging.getLogger(__name__)
@@ -26,6 +27,8 @@ router = APIRouter()
 
 class TenantOdooInfo(BaseModel):
     """Tenant Odoo information model."""
+    model_config = ConfigDict(frozen=True)
+
     id: str
     name: str
     odooDatabase: str
@@ -39,6 +42,8 @@ class TenantOdooInfo(BaseModel):
 
 class ProvisionRequest(BaseModel):
     """Request to provision Odoo for a tenant."""
+    model_config = ConfigDict(frozen=True)
+
     enableEnergyModules: bool = True
     additionalModules: list[str] = []
 
@@ -56,7 +61,7 @@ async def get_tenant_info(
     """
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate"
     response.headers["Pragma"] = "no-cache"
-    logger.info(f"Getting Odoo info for tenant: {tenant_id}")
+    logger.info("Getting Odoo info for tenant: %s", tenant_id)
 
     try:
         info = await get_tenant_odoo_info(tenant_id)
@@ -82,7 +87,7 @@ async def get_tenant_info(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting tenant info: {e}")
+        logger.error("Error getting tenant info: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get tenant info")
 
 
@@ -98,7 +103,7 @@ async def provision_tenant(
     Creates a new PostgreSQL database from the template and installs
     required modules including energy community modules if requested.
     """
-    logger.info(f"Provisioning Odoo for tenant: {tenant_id}")
+    logger.info("Provisioning Odoo for tenant: %s", tenant_id)
 
     # Check if already exists
     existing = await get_tenant_odoo_info(tenant_id)
@@ -113,7 +118,7 @@ async def provision_tenant(
         })
 
         # Create database using Odoo client
-        odoo_client = OdooClient()
+        odoo_client = get_odoo_client()
         db_name = f"nkz_odoo_{tenant_id}"
 
         # Duplicate from template
@@ -156,13 +161,13 @@ async def provision_tenant(
                     client_id=settings.ODOO_OAUTH_CLIENT_ID,
                 )
             except Exception as oauth_err:
-                logger.warning(f"OAuth provider setup failed (non-fatal): {oauth_err}")
+                logger.warning("OAuth provider setup failed (non-fatal): %s", oauth_err)
 
         # Register NGSI-LD subscriptions for this tenant
         from app.services.ngsi_sync import register_tenant_subscriptions
         await register_tenant_subscriptions(tenant_id)
 
-        logger.info(f"Successfully provisioned Odoo for tenant: {tenant_id}")
+        logger.info("Successfully provisioned Odoo for tenant: %s", tenant_id)
 
         # Save tenant info including OAuth provider ID
         await save_tenant_odoo_info(tenant_id, {
@@ -191,7 +196,7 @@ async def provision_tenant(
         )
 
     except Exception as e:
-        logger.error(f"Failed to provision Odoo for tenant {tenant_id}: {e}")
+        logger.error("Failed to provision Odoo for tenant %s: %s", tenant_id, e)
 
         # Mark as error
         await save_tenant_odoo_info(tenant_id, {
@@ -213,7 +218,7 @@ async def delete_tenant_odoo(
 
     WARNING: This permanently deletes all tenant data in Odoo.
     """
-    logger.warning(f"Deleting Odoo for tenant: {tenant_id} by user: {user.get('email')}")
+    logger.warning("Deleting Odoo for tenant: %s by user: %s", tenant_id, user.get('email'))
 
     try:
         info = await get_tenant_odoo_info(tenant_id)
@@ -223,7 +228,7 @@ async def delete_tenant_odoo(
         db_name = info.get("database", f"nkz_odoo_{tenant_id}")
 
         # Delete database
-        odoo_client = OdooClient()
+        odoo_client = get_odoo_client()
         await odoo_client.delete_database(db_name)
 
         # Remove from our records
@@ -233,17 +238,18 @@ async def delete_tenant_odoo(
         from app.services.ngsi_sync import remove_tenant_subscriptions
         await remove_tenant_subscriptions(tenant_id)
 
-        logger.info(f"Successfully deleted Odoo for tenant: {tenant_id}")
+        logger.info("Successfully deleted Odoo for tenant: %s", tenant_id)
 
         return {"status": "deleted", "tenant_id": tenant_id}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to delete Odoo for tenant {tenant_id}: {e}")
+        logger.error("Failed to delete Odoo for tenant %s: %s", tenant_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to delete Odoo: {str(e)}")
 
 
+@lru_cache(maxsize=1024)
 def _build_tenant_odoo_url(tenant_id: str) -> str:
     """Build the Odoo web URL for a tenant."""
     db_name = f"nkz_odoo_{tenant_id}"
@@ -278,7 +284,7 @@ async def _build_sso_login_url(
     if not provider_id and settings.KEYCLOAK_PUBLIC_URL:
         try:
             db_name = info.get("database") or f"nkz_odoo_{tenant_id}"
-            odoo_client = OdooClient()
+            odoo_client = get_odoo_client()
             provider_id = await odoo_client.get_oauth_provider_id(
                 db_name, settings.ODOO_OAUTH_CLIENT_ID
             )
@@ -289,6 +295,6 @@ async def _build_sso_login_url(
                     "oauth_provider_id": provider_id,
                 })
         except Exception as e:
-            logger.warning(f"Could not fetch OAuth provider ID: {e}")
+            logger.warning("Could not fetch OAuth provider ID: %s", e)
 
     return _build_sso_login_url_sync(tenant_id, provider_id)
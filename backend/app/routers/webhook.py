@@ -8,31 +8,29 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+import asyncio
 import logging
 import hmac
 import hashlib
+import time
+from functools import lru_cache
 from fastapi import APIRouter, Request, HTTPException, Header
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
 from typing import Optional, Any
-from datetime import datetime
+from datetime import datetime, timezone
+import orjson
 
 from app.config import settings
+from app.middleware.auth import verify_jwt
 from app.services.ngsi_sync import NgsildSyncService
 from app.services.n8n_integration import N8NIntegration
+from app.services.sync_queue import enqueue_entities
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-class NGSILDNotification(BaseModel):
-    """NGSI-LD subscription notification format."""
-    id: str
-    type: str = "Notification"
-    subscriptionId: str
-    notifiedAt: str
-    data: list[dict[str, Any]]
-
-
 class N8NWebhookPayload(BaseModel):
     """N8N webhook payload format."""
     workflow_id: str
@@ -42,11 +40,36 @@ class N8NWebhookPayload(BaseModel):
     tenant_id: str
 
 
+# Built once at import instead of on every request
+_N8N_PAYLOAD_ADAPTER = TypeAdapter(N8NWebhookPayload)
+
+_SECRET_BYTES = settings.N8N_WEBHOOK_SECRET.encode()
+
+# Keyed HMAC state (key padding + inner/outer init done once); copied per request
+_HMAC_TEMPLATE = hmac.new(_SECRET_BYTES, digestmod=hashlib.sha256)
+_ODOO_HMAC_TEMPLATE = hmac.new(settings.ODOO_WEBHOOK_SECRET.encode(), digestmod=hashlib.sha256)
+
+# Prebuilt responses for rejected notifications (nothing allocated per request)
+_IGNORED_UNKNOWN_SUBSCRIPTION = ORJSONResponse({"status": "ignored", "reason": "unknown_subscription"})
+_IGNORED_UNKNOWN_TENANT = ORJSONResponse({"status": "ignored", "reason": "unknown_tenant"})
+
+# Response timestamp, rebuilt at most once per second
+_timestamp_second = 0
+_timestamp_iso = ""
+
+
+def _timestamp() -> str:
+    """Current UTC time as ISO 8601, at one-second resolution."""
+    global _timestamp_second, _timestamp_iso
+    now = int(time.time())
+    if now != _timestamp_second:
+        _timestamp_second = now
+        _timestamp_iso = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    return _timestamp_iso
+
+
 @router.post("/ngsi")
-async def handle_ngsi_notification(
-    notification: NGSILDNotification,
-    request: Request
-):
+async def handle_ngsi_notification(request: Request):
     """
     Handle NGSI-LD subscription notifications.
 
@@ -60,57 +83,60 @@ async def handle_ngsi_notification(
     Flow:
     1. Parse notification
     2. Extract tenant ID from subscription metadata
-    3. Sync each entity to Odoo
+    3. Queue each entity for sync to Odoo (202 Accepted)
     """
-    logger.info(f"Received NGSI-LD notification: {notification.id}")
-    logger.debug(f"Subscription: {notification.subscriptionId}, Entities: {len(notification.data)}")
+    # Trusted internal path (Orion-LD): read the fields we need straight from
+    # the decoded body instead of validating every entity with Pydantic
+    try:
+        notification = orjson.loads(await request.body())
+        subscription_id = notification["subscriptionId"]
+        entities = notification["data"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Malformed payload")
+
+    if not isinstance(subscription_id, str) or not isinstance(entities, list):
+        raise HTTPException(status_code=400, detail="Malformed payload")
+
+    # Anything queued must be syncable: an object with a string id and type
+    for entity in entities:
+        if (
+            type(entity) is not dict
+            or not isinstance(entity.get("id"), str)
+            or not isinstance(entity.get("type"), str)
+        ):
+            raise HTTPException(status_code=400, detail="Malformed entity")
+
+    logger.info("Received NGSI-LD notification: %s", notification.get('id'))
+    logger.debug("Subscription: %s, Entities: %s", subscription_id, len(entities))
 
     try:
         # Extract tenant ID from subscription ID (format: nkz-odoo-{tenant_id}-{entity_type})
         # Or look it up from our subscription registry
-        tenant_id = _extract_tenant_from_subscription(notification.subscriptionId)
+        tenant_id = _extract_tenant_from_subscription(subscription_id)
 
         if not tenant_id:
-            logger.warning(f"Could not determine tenant for subscription: {notification.subscriptionId}")
-            return {"status": "ignored", "reason": "unknown_subscription"}
-
-        sync_service = NgsildSyncService(tenant_id)
-
-        synced = 0
-        errors = []
-
-        for entity in notification.data:
-            try:
-                entity_id = entity.get("id")
-                entity_type = entity.get("type")
-
-                logger.info(f"Syncing entity {entity_id} ({entity_type}) for tenant {tenant_id}")
-
-                await sync_service.sync_entity_to_odoo(entity)
-                synced += 1
-
-            except Exception as e:
-                error_msg = f"Failed to sync {entity.get('id')}: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
+            logger.warning("Could not determine tenant for subscription: %s", subscription_id)
+            return _IGNORED_UNKNOWN_SUBSCRIPTION
 
-        logger.info(f"NGSI-LD notification processed: {synced} synced, {len(errors)} errors")
+        # Store-then-process: entities are persisted and synced by background
+        # workers, so Orion-LD gets its answer without waiting on Odoo
+        queued = await enqueue_entities(tenant_id, entities)
+        logger.info("NGSI-LD notification accepted: %s entities queued for tenant %s", queued, tenant_id)
 
-        return {
-            "status": "processed",
-            "synced": synced,
-            "errors": len(errors),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        return ORJSONResponse({
+            "status": "accepted",
+            "count": queued,
+            "timestamp": _timestamp()
+        }, status_code=202)
 
     except Exception as e:
-        logger.error(f"Failed to process NGSI-LD notification: {e}")
+        logger.error("Failed to process NGSI-LD notification: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to process notification: {str(e)}")
 
 
 @router.post("/n8n")
 async def handle_n8n_webhook(
-    payload: N8NWebhookPayload,
+    request: Request,
     x_n8n_signature: Optional[str] = Header(None)
 ):
     """
@@ -124,16 +150,23 @@ async def handle_n8n_webhook(
     - odoo.energy.log: Log energy production data
     - sync.request: Request entity sync
     """
-    logger.info(f"Received N8N webhook: {payload.event} from workflow {payload.workflow_id}")
+    body = await request.body()
 
-    # Validate signature if configured
-    if settings.N8N_WEBHOOK_SECRET:
+    # Validate signature if configured (over the wire bytes N8N signed)
+    if _SECRET_BYTES:
         if not x_n8n_signature:
             raise HTTPException(status_code=401, detail="Missing webhook signature")
 
-        if not _verify_n8n_signature(payload.model_dump_json(), x_n8n_signature):
+        if not _verify_n8n_signature(body, x_n8n_signature):
             raise HTTPException(status_code=401, detail="Invalid webhook signature")
 
+    try:
+        payload = _N8N_PAYLOAD_ADAPTER.validate_json(body)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Malformed payload")
+
+    logger.info("Received N8N webhook: %s from workflow %s", payload.event, payload.workflow_id)
+
     try:
         n8n_service = N8NIntegration(payload.tenant_id)
 
@@ -144,29 +177,46 @@ async def handle_n8n_webhook(
             execution_id=payload.execution_id
         )
 
-        return {
+        return ORJSONResponse({
             "status": "processed",
             "event": payload.event,
             "result": result,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": _timestamp()
+        })
 
     except Exception as e:
-        logger.error(f"Failed to process N8N webhook: {e}")
+        logger.error("Failed to process N8N webhook: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to process webhook: {str(e)}")
 
 
 @router.post("/odoo")
-async def handle_odoo_webhook(request: Request):
+async def handle_odoo_webhook(
+    request: Request,
+    x_nekazari_signature: Optional[str] = Header(None)
+):
     """
     Handle webhooks from Odoo.
 
     Odoo can send webhooks when records are modified.
     This allows reverse sync from Odoo to NGSI-LD.
+
+    The nekazari_connector signs its webhooks with ODOO_WEBHOOK_SECRET;
+    without a configured secret, only user JWTs are accepted.
     """
+    raw_body = await request.body()
+
+    if settings.ODOO_WEBHOOK_SECRET:
+        if not x_nekazari_signature:
+            raise HTTPException(status_code=401, detail="Missing webhook signature")
+
+        if not _verify_odoo_signature(raw_body, x_nekazari_signature):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    else:
+        await verify_jwt(request)
+
     try:
-        body = await request.json()
-        logger.info(f"Received Odoo webhook: {body.get('event')}")
+        body = orjson.loads(raw_body)
+        logger.info("Received Odoo webhook: %s", body.get('event'))
 
         event = body.get("event")
         model = body.get("model")
@@ -174,55 +224,68 @@ async def handle_odoo_webhook(request: Request):
         tenant_db = body.get("database")
 
         # Extract tenant ID from database name (format: nkz_odoo_{tenant_id})
-        tenant_id = tenant_db.replace("nkz_odoo_", "") if tenant_db else None
+        tenant_id = tenant_db.removeprefix("nkz_odoo_") if tenant_db else None
 
         if not tenant_id:
-            return {"status": "ignored", "reason": "unknown_tenant"}
+            return _IGNORED_UNKNOWN_TENANT
 
         # Handle different events
         if event == "record.create" or event == "record.write":
-            # Sync back to NGSI-LD if this model is mapped
+            # Sync back to NGSI-LD if this model is mapped; batched
+            # recordset writes list their records instead of record_id
+            records = body.get("records")
+            record_ids = [record.get("id") for record in records] if records else [record_id]
+
             sync_service = NgsildSyncService(tenant_id)
-            await sync_service.sync_odoo_to_ngsi(model, record_id)
+            await asyncio.gather(*(
+                sync_service.sync_odoo_to_ngsi(model, odoo_id) for odoo_id in record_ids
+            ))
 
-        return {
+        return ORJSONResponse({
             "status": "processed",
             "event": event,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": _timestamp()
+        })
 
     except Exception as e:
-        logger.error(f"Failed to process Odoo webhook: {e}")
+        logger.error("Failed to process Odoo webhook: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@lru_cache(maxsize=4096)
 def _extract_tenant_from_subscription(subscription_id: str) -> Optional[str]:
     """
     Extract tenant ID from subscription ID.
 
     Subscription IDs follow the pattern: urn:ngsi-ld:Subscription:nkz-odoo-{tenant_id}-{type}
+    Pure function over a small set of IDs (tenant x entity type), so results are memoized.
     """
-    try:
-        # Format: urn:ngsi-ld:Subscription:nkz-odoo-{tenant_id}-{type}
-        parts = subscription_id.split(":")
-        if len(parts) >= 4:
-            sub_name = parts[-1]  # nkz-odoo-{tenant_id}-{type}
-            name_parts = sub_name.split("-")
-            if len(name_parts) >= 4 and name_parts[0] == "nkz" and name_parts[1] == "odoo":
-                # Tenant ID is everything between "odoo-" and the last part (type)
-                return "-".join(name_parts[2:-1])
-    except Exception as e:
-        logger.error(f"Failed to extract tenant from subscription: {e}")
+    # Format: urn:ngsi-ld:Subscription:nkz-odoo-{tenant_id}-{type}
+    prefix, _, sub_name = subscription_id.rpartition(":")
+    if prefix.count(":") < 2 or not sub_name.startswith("nkz-odoo-"):
+        return None
 
-    return None
+    # Tenant ID is everything between "odoo-" and the last part (type)
+    tenant_id, _, _ = sub_name.removeprefix("nkz-odoo-").rpartition("-")
+    return tenant_id or None
 
 
-def _verify_n8n_signature(payload: str, signature: str) -> bool:
-    """Verify N8N webhook signature using HMAC."""
-    expected = hmac.new(
-        settings.N8N_WEBHOOK_SECRET.encode(),
-        payload.encode(),
-        hashlib.sha256
-    ).hexdigest()
+def _verify_n8n_signature(body: bytes, signature: str) -> bool:
+    """Verify N8N webhook signature using HMAC over the raw request body."""
+    mac = _HMAC_TEMPLATE.copy()
+    mac.update(body)
+    expected = mac.hexdigest()
 
     return hmac.compare_digest(expected, signature)
+
+
+def _verify_odoo_signature(body: bytes, signature: str) -> bool:
+    """Verify an Odoo connector signature (sha256=<hex>) over the raw request body."""
+    if not signature.startswith("sha256="):
+        return False
+
+    mac = _ODOO_HMAC_TEMPLATE.copy()
+    mac.update(body)
+    expected = mac.hexdigest()
+
+    return hmac.compare_digest(expected, signature[len("sha256="):])
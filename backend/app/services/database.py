@@ -8,10 +8,13 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+import asyncio
 import logging
 from typing import Optional, Any
 from datetime import datetime
 import asyncpg
+from cachetools import TTLCache
+import orjson
 
 from app.config import settings
 
@@ -20,83 +23,148 @@ logger = logging.getLogger(__name__)
 # Connection pool
 _pool: Optional[asyncpg.Pool] = None
 
+# Short-lived cache of tenant info rows (frontend polls /info while provisioning).
+# Invalidated on local writes; other replicas may serve data up to ttl seconds old.
+_tenant_info_cache: TTLCache = TTLCache(maxsize=2048, ttl=10)
 
-async def get_pool() -> asyncpg.Pool:
-    """Get or create database connection pool."""
+# Odoo database name per tenant; only changes during provisioning
+_odoo_database_cache: TTLCache = TTLCache(maxsize=2048, ttl=300)
+
+# Tenant info lookups in flight, so concurrent cache misses share one query
+_tenant_info_inflight: dict[str, asyncio.Task] = {}
+
+
+def _encode_jsonb(value: Any) -> str:
+    """Encode a Python value for a jsonb parameter."""
+    return orjson.dumps(value).decode()
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Per-connection setup: (de)serialize jsonb with orjson automatically."""
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=_encode_jsonb,
+        decoder=orjson.loads,
+        schema="pg_catalog",
+        format="text"
+    )
+
+
+async def init_pool():
+    """Create the database connection pool (called once on app startup)."""
     global _pool
-    if _pool is None:
-        _pool = await asyncpg.create_pool(
-            settings.DATABASE_URL,
-            min_size=2,
-            max_size=10
-        )
+    # asyncpg prepares and caches every query per connection; a larger cache
+    # with no expiry means each query string is parsed/planned only once
+    _pool = await asyncpg.create_pool(
+        settings.DATABASE_URL,
+        min_size=5,
+        max_size=20,
+        statement_cache_size=1024,
+        max_cached_statement_lifetime=0,
+        init=_init_connection
+    )
+
+
+async def close_pool():
+    """Close the database connection pool (called on app shutdown)."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_pool() -> asyncpg.Pool:
+    """Get the database connection pool created by init_pool()."""
     return _pool
 
 
+# Advisory lock key serializing schema setup across pods
+_SCHEMA_LOCK_ID = 742839
+
+# Module schema, applied in one round-trip by init_db()
+_SCHEMA_SQL = """
+    -- Tenant Odoo info
+    CREATE TABLE IF NOT EXISTS odoo_tenant_info (
+        tenant_id VARCHAR(255) PRIMARY KEY,
+        name VARCHAR(255),
+        database VARCHAR(255),
+        status VARCHAR(50) DEFAULT 'pending',
+        energy_modules_enabled BOOLEAN DEFAULT FALSE,
+        installed_modules JSONB DEFAULT '[]'::jsonb,
+        admin_email VARCHAR(255),
+        created_at TIMESTAMP WITH TIME ZONE,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+        error TEXT
+    );
+
+    -- Entity mappings
+    CREATE TABLE IF NOT EXISTS odoo_entity_mappings (
+        id SERIAL PRIMARY KEY,
+        tenant_id VARCHAR(255) NOT NULL,
+        ngsi_id VARCHAR(512) NOT NULL,
+        ngsi_type VARCHAR(255) NOT NULL,
+        odoo_id INTEGER NOT NULL,
+        odoo_model VARCHAR(255) NOT NULL,
+        odoo_name VARCHAR(512),
+        last_sync TIMESTAMP WITH TIME ZONE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+        UNIQUE(tenant_id, ngsi_id)
+    );
+
+    -- Sync status
+    CREATE TABLE IF NOT EXISTS odoo_sync_status (
+        tenant_id VARCHAR(255) PRIMARY KEY,
+        status VARCHAR(50) DEFAULT 'never_synced',
+        last_sync TIMESTAMP WITH TIME ZONE,
+        entities_synced INTEGER DEFAULT 0,
+        errors JSONB DEFAULT '[]'::jsonb,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    );
+
+    -- Inbox for NGSI-LD notifications awaiting sync (crash recovery)
+    CREATE TABLE IF NOT EXISTS odoo_webhook_inbox (
+        id BIGSERIAL PRIMARY KEY,
+        tenant_id VARCHAR(255) NOT NULL,
+        entity JSONB NOT NULL,
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    );
+
+    -- Lease on inbox items: which process is syncing the item, and since when
+    ALTER TABLE odoo_webhook_inbox ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(64);
+    ALTER TABLE odoo_webhook_inbox ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;
+
+    -- Indexes. Mapping listings page through rows in id order, per tenant
+    -- and optionally per type; (tenant_id, ngsi_id) lookups use the UNIQUE
+    -- constraint's index.
+    CREATE INDEX IF NOT EXISTS idx_odoo_mappings_tenant_type_id
+    ON odoo_entity_mappings(tenant_id, ngsi_type, id);
+    CREATE INDEX IF NOT EXISTS idx_odoo_mappings_tenant_id
+    ON odoo_entity_mappings(tenant_id, id);
+
+    -- Superseded indexes (only cost writes)
+    DROP INDEX IF EXISTS idx_odoo_mappings_tenant;
+    DROP INDEX IF EXISTS idx_odoo_mappings_ngsi_id;
+    DROP INDEX IF EXISTS idx_odoo_mappings_tenant_type;
+"""
+
+
 async def init_db():
     """Initialize database tables for the Odoo module.
     
     This function is idempotent and handles race conditions from multiple
     pods starting simultaneously.
     """
-    pool = await get_pool()
+    pool = get_pool()
 
     async with pool.acquire() as conn:
         try:
-            # Create tables for tenant Odoo info
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS odoo_tenant_info (
-                    tenant_id VARCHAR(255) PRIMARY KEY,
-                    name VARCHAR(255),
-                    database VARCHAR(255),
-                    status VARCHAR(50) DEFAULT 'pending',
-                    energy_modules_enabled BOOLEAN DEFAULT FALSE,
-                    installed_modules JSONB DEFAULT '[]'::jsonb,
-                    admin_email VARCHAR(255),
-                    created_at TIMESTAMP WITH TIME ZONE,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                    error TEXT
-                )
-            """)
-
-            # Create tables for entity mappings
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS odoo_entity_mappings (
-                    id SERIAL PRIMARY KEY,
-                    tenant_id VARCHAR(255) NOT NULL,
-                    ngsi_id VARCHAR(512) NOT NULL,
-                    ngsi_type VARCHAR(255) NOT NULL,
-                    odoo_id INTEGER NOT NULL,
-                    odoo_model VARCHAR(255) NOT NULL,
-                    odoo_name VARCHAR(512),
-                    last_sync TIMESTAMP WITH TIME ZONE,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                    UNIQUE(tenant_id, ngsi_id)
-                )
-            """)
-
-            # Create table for sync status
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS odoo_sync_status (
-                    tenant_id VARCHAR(255) PRIMARY KEY,
-                    status VARCHAR(50) DEFAULT 'never_synced',
-                    last_sync TIMESTAMP WITH TIME ZONE,
-                    entities_synced INTEGER DEFAULT 0,
-                    errors JSONB DEFAULT '[]'::jsonb,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-                )
-            """)
-
-            # Create indexes
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_odoo_mappings_tenant
-                ON odoo_entity_mappings(tenant_id)
-            """)
-
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_odoo_mappings_ngsi_id
-                ON odoo_entity_mappings(ngsi_id)
-            """)
+            # One transaction, one round-trip. The transaction-scoped advisory
+            # lock makes concurrently starting pods apply the schema in turn.
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", _SCHEMA_LOCK_ID)
+                await conn.execute(_SCHEMA_SQL)
 
             logger.info("Database tables initialized")
 
@@ -110,10 +178,9 @@ async def init_db():
 
 # Tenant Info Operations
 
-async def get_tenant_odoo_info(tenant_id: str) -> Optional[dict]:
-    """Get Odoo info for a tenant."""
-    import json
-    pool = await get_pool()
+async def _fetch_tenant_odoo_info(tenant_id: str) -> Optional[dict]:
+    """Query a tenant's Odoo info and cache it."""
+    pool = get_pool()
 
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
@@ -121,22 +188,58 @@ async def get_tenant_odoo_info(tenant_id: str) -> Optional[dict]:
             tenant_id
         )
 
-        if row:
-            data = dict(row)
-            # Parse JSON fields
-            if isinstance(data.get("installed_modules"), str):
-                try:
-                    data["installed_modules"] = json.loads(data["installed_modules"])
-                except json.JSONDecodeError:
-                    data["installed_modules"] = []
-            return data
+    if not row:
+        return None
+
+    # JSONB fields arrive decoded via the connection's type codec
+    data = dict(row)
+    # Skip caching if a save invalidated this lookup while it ran
+    if _tenant_info_inflight.get(tenant_id) is asyncio.current_task():
+        _tenant_info_cache[tenant_id] = data
+    return data
+
+
+async def get_tenant_odoo_info(tenant_id: str) -> Optional[dict]:
+    """Get Odoo info for a tenant."""
+    cached = _tenant_info_cache.get(tenant_id)
+    if cached is not None:
+        return dict(cached)
+
+    task = _tenant_info_inflight.get(tenant_id)
+    if task is None:
+        task = asyncio.create_task(_fetch_tenant_odoo_info(tenant_id))
+        _tenant_info_inflight[tenant_id] = task
+        task.add_done_callback(
+            lambda done: _tenant_info_inflight.pop(tenant_id, None)
+            if _tenant_info_inflight.get(tenant_id) is done else None
+        )
+
+    # Shield so one cancelled caller doesn't cancel the shared lookup
+    data = await asyncio.shield(task)
+    return dict(data) if data else None
+
+
+async def get_tenant_odoo_database(tenant_id: str) -> Optional[str]:
+    """Get the Odoo database name for a tenant, or None if not provisioned."""
+    db_name = _odoo_database_cache.get(tenant_id)
+    if db_name is not None:
+        return db_name
+
+    info = await get_tenant_odoo_info(tenant_id)
+    if not info:
         return None
 
+    db_name = info.get("database") or f"nkz_odoo_{tenant_id}"
+    _odoo_database_cache[tenant_id] = db_name
+    return db_name
+
 
 async def save_tenant_odoo_info(tenant_id: str, info: Optional[dict]):
     """Save or delete Odoo info for a tenant."""
-    import json
-    pool = await get_pool()
+    _tenant_info_cache.pop(tenant_id, None)
+    _tenant_info_inflight.pop(tenant_id, None)
+    _odoo_database_cache.pop(tenant_id, None)
+    pool = get_pool()
 
     async with pool.acquire() as conn:
         if info is None:
@@ -165,7 +268,7 @@ async def save_tenant_odoo_info(tenant_id: str, info: Optional[dict]):
                 info.get("database"),
                 info.get("status"),
                 info.get("energy_modules_enabled", False),
-                json.dumps(info.get("installed_modules", [])),  # Use json.dumps for valid JSON
+                info.get("installed_modules", []),
                 info.get("admin_email"),
                 info.get("created_at")
             )
@@ -173,24 +276,43 @@ async def save_tenant_odoo_info(tenant_id: str, info: Optional[dict]):
 
 # Entity Mapping Operations
 
-async def get_entity_mappings(
+async def get_entity_mappings_page(
     tenant_id: str,
-    ngsi_type: Optional[str] = None
+    ngsi_type: Optional[str] = None,
+    after_id: int = 0,
+    limit: int = 500
 ) -> list[dict]:
-    """Get entity mappings for a tenant."""
-    pool = await get_pool()
+    """
+    Get one page of a tenant's entity mappings, in id order.
+
+    Pages are fetched by keyset (id > after_id), so no connection or
+    transaction is held between pages.
+
+    Args:
+        tenant_id: Tenant ID
+        ngsi_type: Only mappings of this NGSI-LD type
+        after_id: ID of the last mapping of the previous page (0 for the first)
+        limit: Max mappings in the page
+
+    Returns:
+        Mapping rows
+    """
+    pool = get_pool()
 
     async with pool.acquire() as conn:
         if ngsi_type:
             rows = await conn.fetch(
                 """SELECT * FROM odoo_entity_mappings
-                   WHERE tenant_id = $1 AND ngsi_type = $2""",
-                tenant_id, ngsi_type
+                   WHERE tenant_id = $1 AND ngsi_type = $2 AND id > $3
+                   ORDER BY id LIMIT $4""",
+                tenant_id, ngsi_type, after_id, limit
             )
         else:
             rows = await conn.fetch(
-                "SELECT * FROM odoo_entity_mappings WHERE tenant_id = $1",
-                tenant_id
+                """SELECT * FROM odoo_entity_mappings
+                   WHERE tenant_id = $1 AND id > $2
+                   ORDER BY id LIMIT $3""",
+                tenant_id, after_id, limit
             )
 
         return [dict(row) for row in rows]
@@ -201,7 +323,7 @@ async def get_entity_mapping_by_ngsi_id(
     ngsi_id: str
 ) -> Optional[dict]:
     """Get entity mapping by NGSI-LD ID."""
-    pool = await get_pool()
+    pool = get_pool()
 
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
@@ -215,28 +337,70 @@ async def get_entity_mapping_by_ngsi_id(
         return None
 
 
+_UPSERT_MAPPING_SQL = """
+    INSERT INTO odoo_entity_mappings
+        (tenant_id, ngsi_id, ngsi_type, odoo_id, odoo_model, odoo_name, last_sync)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    ON CONFLICT (tenant_id, ngsi_id) DO UPDATE SET
+        odoo_id = EXCLUDED.odoo_id,
+        odoo_model = EXCLUDED.odoo_model,
+        odoo_name = EXCLUDED.odoo_name,
+        last_sync = EXCLUDED.last_sync
+"""
+
+
+def _mapping_args(tenant_id: str, mapping: dict) -> tuple:
+    """Positional arguments for _UPSERT_MAPPING_SQL."""
+    return (
+        tenant_id,
+        mapping["ngsi_id"],
+        mapping["ngsi_type"],
+        mapping["odoo_id"],
+        mapping["odoo_model"],
+        mapping.get("odoo_name"),
+        mapping.get("last_sync")
+    )
+
+
+async def get_entity_mappings_by_ngsi_ids(
+    tenant_id: str,
+    ngsi_ids: list[str]
+) -> dict[str, dict]:
+    """Get entity mappings for several NGSI-LD IDs, keyed by NGSI-LD ID."""
+    if not ngsi_ids:
+        return {}
+
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """SELECT * FROM odoo_entity_mappings
+               WHERE tenant_id = $1 AND ngsi_id = ANY($2::varchar[])""",
+            tenant_id, ngsi_ids
+        )
+
+        return {row["ngsi_id"]: dict(row) for row in rows}
+
+
 async def create_entity_mapping(tenant_id: str, mapping: dict):
     """Create or update entity mapping."""
-    pool = await get_pool()
+    pool = get_pool()
 
     async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO odoo_entity_mappings
-                (tenant_id, ngsi_id, ngsi_type, odoo_id, odoo_model, odoo_name, last_sync)
-            VALUES ($1, $2, $3, $4, $5, $6, $7)
-            ON CONFLICT (tenant_id, ngsi_id) DO UPDATE SET
-                odoo_id = EXCLUDED.odoo_id,
-                odoo_model = EXCLUDED.odoo_model,
-                odoo_name = EXCLUDED.odoo_name,
-                last_sync = EXCLUDED.last_sync
-        """,
-            tenant_id,
-            mapping["ngsi_id"],
-            mapping["ngsi_type"],
-            mapping["odoo_id"],
-            mapping["odoo_model"],
-            mapping.get("odoo_name"),
-            mapping.get("last_sync")
+        await conn.execute(_UPSERT_MAPPING_SQL, *_mapping_args(tenant_id, mapping))
+
+
+async def create_entity_mappings_bulk(tenant_id: str, mappings: list[dict]):
+    """Create or update many entity mappings in a single batch."""
+    if not mappings:
+        return
+
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        await conn.executemany(
+            _UPSERT_MAPPING_SQL,
+            [_mapping_args(tenant_id, mapping) for mapping in mappings]
         )
 
 
@@ -244,7 +408,7 @@ async def create_entity_mapping(tenant_id: str, mapping: dict):
 
 async def get_sync_status(tenant_id: str) -> Optional[dict]:
     """Get sync status for a tenant."""
-    pool = await get_pool()
+    pool = get_pool()
 
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
@@ -259,8 +423,7 @@ async def get_sync_status(tenant_id: str) -> Optional[dict]:
 
 async def update_sync_status(tenant_id: str, status: dict):
     """Update sync status for a tenant."""
-    import json
-    pool = await get_pool()
+    pool = get_pool()
 
     async with pool.acquire() as conn:
         await conn.execute("""
@@ -278,5 +441,180 @@ async def update_sync_status(tenant_id: str, status: dict):
             status.get("status"),
             status.get("last_sync"),
             status.get("entities_synced", 0),
-            json.dumps(status.get("errors", []))  # Use json.dumps for valid JSON
+            status.get("errors", [])
+        )
+
+
+async def add_sync_error(tenant_id: str, message: str, keep: int = 50):
+    """
+    Append an error to a tenant's sync status, keeping only the latest ones.
+
+    Only the errors column is changed, so this can't overwrite the status
+    of a sync running at the same time.
+
+    Args:
+        tenant_id: Tenant ID
+        message: Error message
+        keep: Number of most recent errors to keep
+    """
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO odoo_sync_status (tenant_id, errors, updated_at)
+            VALUES ($1, jsonb_build_array($2::text), NOW())
+            ON CONFLICT (tenant_id) DO UPDATE SET
+                errors = (
+                    SELECT COALESCE(jsonb_agg(e ORDER BY i), '[]'::jsonb)
+                    FROM jsonb_array_elements(
+                        COALESCE(odoo_sync_status.errors, '[]'::jsonb) || EXCLUDED.errors
+                    ) WITH ORDINALITY AS t(e, i)
+                    WHERE i > jsonb_array_length(
+                        COALESCE(odoo_sync_status.errors, '[]'::jsonb) || EXCLUDED.errors
+                    ) - $3
+                ),
+                updated_at = NOW()
+        """, tenant_id, message, keep)
+
+
+# Webhook Inbox Operations
+
+async def add_webhook_inbox_items(
+    tenant_id: str,
+    entities: list[dict],
+    owner: str
+) -> list[int]:
+    """
+    Persist NGSI-LD entities awaiting sync, claimed by the calling process.
+
+    Args:
+        tenant_id: Tenant ID
+        entities: NGSI-LD entities from a notification
+        owner: Claim owner (the process that will sync them)
+
+    Returns:
+        Inbox item IDs, in the same order as entities
+    """
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            INSERT INTO odoo_webhook_inbox (tenant_id, entity, claimed_by, claimed_at)
+            SELECT $1, e, $3, NOW() FROM unnest($2::jsonb[]) AS e
+            RETURNING id
+        """,
+            tenant_id,
+            entities,
+            owner
+        )
+
+        return [row["id"] for row in rows]
+
+
+async def claim_webhook_inbox_items(
+    owner: str,
+    max_attempts: int,
+    lease_seconds: int,
+    limit: int
+) -> list[dict]:
+    """
+    Claim unclaimed inbox items, and items whose lease has expired.
+
+    Rows being claimed by another process at the same time are skipped,
+    so each item is claimed by one process only.
+
+    Args:
+        owner: Claim owner
+        max_attempts: Items with this many failed attempts are not retried
+        lease_seconds: Age after which another process's claim expires
+        limit: Max items to claim
+
+    Returns:
+        Claimed items (id, tenant_id, entity), oldest first
+    """
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            UPDATE odoo_webhook_inbox SET claimed_by = $1, claimed_at = NOW()
+            WHERE id IN (
+                SELECT id FROM odoo_webhook_inbox
+                WHERE attempts < $2
+                  AND (claimed_at IS NULL OR claimed_at < NOW() - make_interval(secs => $3))
+                ORDER BY id
+                LIMIT $4
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, tenant_id, entity
+        """,
+            owner, max_attempts, float(lease_seconds), limit
+        )
+
+        return sorted((dict(row) for row in rows), key=lambda row: row["id"])
+
+
+async def renew_webhook_inbox_claims(item_ids: list[int], owner: str) -> set[int]:
+    """
+    Renew the lease on inbox items before syncing them.
+
+    Args:
+        item_ids: Inbox item IDs
+        owner: Claim owner
+
+    Returns:
+        IDs still claimed by owner (others were taken over after expiry)
+    """
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            UPDATE odoo_webhook_inbox SET claimed_at = NOW()
+            WHERE id = ANY($1::bigint[]) AND claimed_by = $2
+            RETURNING id
+        """,
+            item_ids, owner
+        )
+
+        return {row["id"] for row in rows}
+
+
+async def release_webhook_inbox_claims(owner: str):
+    """Release all claims held by owner (e.g. on shutdown)."""
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            UPDATE odoo_webhook_inbox SET claimed_by = NULL, claimed_at = NULL
+            WHERE claimed_by = $1
+        """,
+            owner
+        )
+
+
+async def delete_webhook_inbox_items(item_ids: list[int]):
+    """Delete inbox items once their entities have been synced."""
+    if not item_ids:
+        return
+
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "DELETE FROM odoo_webhook_inbox WHERE id = ANY($1::bigint[])",
+            item_ids
+        )
+
+
+async def mark_webhook_inbox_item_failed(item_id: int, error: str):
+    """Record a failed sync attempt for an inbox item and release its claim."""
+    pool = get_pool()
+
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            UPDATE odoo_webhook_inbox
+            SET attempts = attempts + 1, last_error = $2,
+                claimed_by = NULL, claimed_at = NULL
+            WHERE id = $1
+        """,
+            item_id, error
         )
@@ -0,0 +1,83 @@
+"""
+Nekazari Odoo ERP Module - Shared HTTP Client
+
+Single pooled httpx client reused for all outgoing HTTP calls
+(Odoo, Orion-LD, N8N, Intelligence) so connections are kept alive.
+
+Author: Kate Benetis <kate@robotika.cloud>
+Company: Robotika
+License: AGPL-3.0
+"""
+
+import logging
+from typing import Optional
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Shared client
+_client: Optional[httpx.AsyncClient] = None
+
+# Client bound to the Intelligence API (slow model calls, longer timeout)
+_intelligence_client: Optional[httpx.AsyncClient] = None
+
+# Client bound to Odoo's JSON-RPC endpoint
+_odoo_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared HTTP client."""
+    global _client
+    if _client is None or _client.is_closed:
+        # Fail fast on unreachable services, but give Orion-LD time to
+        # answer large entity queries. Plain HTTP/1.1 keep-alive: all
+        # targets are cluster-internal http:// URLs, where httpx can't
+        # negotiate HTTP/2.
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+    return _client
+
+
+def get_intelligence_client() -> httpx.AsyncClient:
+    """Get or create the HTTP client for the Intelligence API."""
+    global _intelligence_client
+    if _intelligence_client is None or _intelligence_client.is_closed:
+        _intelligence_client = httpx.AsyncClient(
+            base_url=settings.INTELLIGENCE_API_URL,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
+    return _intelligence_client
+
+
+def get_odoo_rpc_client() -> httpx.AsyncClient:
+    """Get or create the HTTP client for Odoo JSON-RPC."""
+    global _odoo_client
+    if _odoo_client is None or _odoo_client.is_closed:
+        # Record operations are quick; database management calls
+        # override the timeout since they can take minutes.
+        _odoo_client = httpx.AsyncClient(
+            base_url=settings.odoo_url,
+            headers={"Content-Type": "application/json"},
+            timeout=httpx.Timeout(120.0, connect=5.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=16)
+        )
+    return _odoo_client
+
+
+async def close_http_client():
+    """Close the shared HTTP clients (called on app shutdown)."""
+    global _client, _intelligence_client, _odoo_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _intelligence_client is not None:
+        await _intelligence_client.aclose()
+        _intelligence_client = None
+    if _odoo_client is not None:
+        await _odoo_client.aclose()
+        _odoo_client = None
@@ -8,37 +8,54 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+import asyncio
 import logging
+import uuid
 from typing import Optional
 from datetime import datetime, timedelta
 import httpx
+import orjson
 
-from app.config import settings
-from app.services.odoo_client import OdooClient
-from app.services.database import get_tenant_odoo_info
+from app.services.http_client import get_intelligence_client
+from app.services.odoo_client import OdooClient, get_odoo_client
+from app.services.database import (
+    get_tenant_odoo_database,
+    add_sync_error
+)
 
 logger = logging.getLogger(__name__)
 
+# Max prediction requests in flight at once during a sync
+_PREDICTION_CONCURRENCY = 10
+
+# Status codes meaning the Intelligence API has no batch endpoint
+_BATCH_UNAVAILABLE = {404, 405, 501}
+
+# Prediction syncs running in the background, per tenant: (job_id, task)
+_prediction_jobs: dict[str, tuple[str, asyncio.Task]] = {}
+
 
 class IntelligenceIntegration:
     """Service for Intelligence module integration."""
 
-    def __init__(self, tenant_id: str):
+    def __init__(self, tenant_id: str, client: Optional[httpx.AsyncClient] = None):
         """
         Initialize Intelligence integration for a tenant.
 
         Args:
             tenant_id: Tenant ID
+            client: HTTP client bound to the Intelligence API
+                (defaults to the shared keep-alive client)
         """
         self.tenant_id = tenant_id
-        self.intelligence_url = settings.INTELLIGENCE_API_URL
+        self._client = client or get_intelligence_client()
 
     async def _get_odoo_database(self) -> str:
         """Get Odoo database name for tenant."""
-        info = await get_tenant_odoo_info(self.tenant_id)
-        if not info:
+        db_name = await get_tenant_odoo_database(self.tenant_id)
+        if not db_name:
             raise ValueError(f"No Odoo configured for tenant: {self.tenant_id}")
-        return info.get("database", f"nkz_odoo_{self.tenant_id}")
+        return db_name
 
     async def get_yield_prediction(
         self,
@@ -55,26 +72,62 @@ class IntelligenceIntegration:
         Returns:
             Prediction data including expected yield and confidence
         """
-        logger.info(f"Getting yield prediction for parcel: {parcel_id}")
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.intelligence_url}/api/intelligence/predict/yield",
-                params={
-                    "entity_id": parcel_id,
-                    "crop_type": crop_type
-                },
-                headers={
-                    "X-Tenant-ID": self.tenant_id
-                },
-                timeout=30.0
-            )
+        logger.info("Getting yield prediction for parcel: %s", parcel_id)
+
+        response = await self._client.get(
+            "/api/intelligence/predict/yield",
+            params={
+                "entity_id": parcel_id,
+                "crop_type": crop_type
+            },
+            headers={
+                "X-Tenant-ID": self.tenant_id
+            }
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Yield prediction failed: {response.status_code}")
-                raise Exception(f"Yield prediction failed: {response.text}")
+        if response.status_code == 200:
+            return orjson.loads(response.content)
+        else:
+            logger.error("Yield prediction failed: %s", response.status_code)
+            raise Exception(f"Yield prediction failed: {response.text}")
+
+    async def get_yield_predictions_batch(
+        self,
+        parcels: list[tuple[str, Optional[str]]]
+    ) -> Optional[dict[str, dict]]:
+        """
+        Get yield predictions for many parcels in a single request.
+
+        Args:
+            parcels: (parcel_id, crop_type) pairs
+
+        Returns:
+            Predictions keyed by parcel ID, or None if the Intelligence
+            API has no batch endpoint
+        """
+        logger.info("Getting yield predictions for %s parcels", len(parcels))
+
+        response = await self._client.post(
+            "/api/intelligence/predict/yield/batch",
+            content=orjson.dumps({
+                "entities": [
+                    {"id": parcel_id, "crop_type": crop_type}
+                    for parcel_id, crop_type in parcels
+                ]
+            }),
+            headers={
+                "Content-Type": "application/json",
+                "X-Tenant-ID": self.tenant_id
+            }
+        )
+
+        if response.status_code == 200:
+            return orjson.loads(response.content).get("predictions", {})
+        elif response.status_code in _BATCH_UNAVAILABLE:
+            return None
+        else:
+            logger.error("Batch yield prediction failed: %s", response.status_code)
+            raise Exception(f"Batch yield prediction failed: {response.text}")
 
     async def get_energy_forecast(
         self,
@@ -91,26 +144,24 @@ class IntelligenceIntegration:
         Returns:
             Forecast data including daily production predictions
         """
-        logger.info(f"Getting energy forecast for installation: {installation_id}")
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.intelligence_url}/api/intelligence/predict/energy",
-                params={
-                    "entity_id": installation_id,
-                    "days": days
-                },
-                headers={
-                    "X-Tenant-ID": self.tenant_id
-                },
-                timeout=30.0
-            )
+        logger.info("Getting energy forecast for installation: %s", installation_id)
+
+        response = await self._client.get(
+            "/api/intelligence/predict/energy",
+            params={
+                "entity_id": installation_id,
+                "days": days
+            },
+            headers={
+                "X-Tenant-ID": self.tenant_id
+            }
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Energy forecast failed: {response.status_code}")
-                raise Exception(f"Energy forecast failed: {response.text}")
+        if response.status_code == 200:
+            return orjson.loads(response.content)
+        else:
+            logger.error("Energy forecast failed: %s", response.status_code)
+            raise Exception(f"Energy forecast failed: {response.text}")
 
     async def sync_predictions_to_odoo(self):
         """
@@ -118,10 +169,10 @@ class IntelligenceIntegration:
 
         Creates or updates report records in Odoo with prediction data.
         """
-        logger.info(f"Syncing predictions to Odoo for tenant: {self.tenant_id}")
+        logger.info("Syncing predictions to Odoo for tenant: %s", self.tenant_id)
 
         db_name = await self._get_odoo_database()
-        odoo = OdooClient()
+        odoo = get_odoo_client()
 
         # Get all parcels and installations
         # Then fetch predictions and create Odoo reports
@@ -135,24 +186,17 @@ class IntelligenceIntegration:
                 fields=["id", "name", "x_ngsi_id", "x_crop_type"]
             )
 
-            for parcel in parcels:
-                try:
-                    prediction = await self.get_yield_prediction(
-                        parcel["x_ngsi_id"],
-                        parcel.get("x_crop_type")
-                    )
-
-                    # Create or update prediction record in Odoo
-                    await self._update_odoo_prediction(
-                        db_name,
-                        odoo,
-                        parcel["id"],
-                        "yield",
-                        prediction
-                    )
-
-                except Exception as e:
-                    logger.warning(f"Failed to get prediction for {parcel['name']}: {e}")
+            semaphore = asyncio.Semaphore(_PREDICTION_CONCURRENCY)
+
+            predictions = await self._fetch_yield_predictions(parcels, semaphore)
+
+            # Create or update prediction records in Odoo in one batch
+            await self._save_odoo_predictions(db_name, odoo, "yield", {
+                parcel["id"]: predictions[parcel["x_ngsi_id"]]
+                for parcel in parcels
+                if parcel["x_ngsi_id"] in predictions
+            })
+            logger.info("Yield predictions synced: %s/%s", len(predictions), len(parcels))
 
             # Fetch energy installations
             installations = await odoo.search_records(
@@ -162,77 +206,153 @@ class IntelligenceIntegration:
                 fields=["id", "name", "x_ngsi_id"]
             )
 
-            for installation in installations:
-                try:
-                    forecast = await self.get_energy_forecast(
-                        installation["x_ngsi_id"],
-                        days=7
-                    )
-
-                    await self._update_odoo_prediction(
-                        db_name,
-                        odoo,
-                        installation["id"],
-                        "energy",
-                        forecast
-                    )
-
-                except Exception as e:
-                    logger.warning(f"Failed to get forecast for {installation['name']}: {e}")
+            forecasts = await asyncio.gather(*(
+                self._fetch_energy_forecast(installation, semaphore)
+                for installation in installations
+            ))
+            energy_predictions = {
+                installation["id"]: forecast
+                for installation, forecast in zip(installations, forecasts)
+                if forecast is not None
+            }
+            await self._save_odoo_predictions(db_name, odoo, "energy", energy_predictions)
+            logger.info("Energy forecasts synced: %s/%s", len(energy_predictions), len(installations))
 
             logger.info("Predictions synced to Odoo successfully")
             return {"status": "success"}
 
         except Exception as e:
-            logger.error(f"Failed to sync predictions: {e}")
+            logger.error("Failed to sync predictions: %s", e)
             raise
 
-    async def _update_odoo_prediction(
+    async def _fetch_yield_predictions(
+        self,
+        parcels: list[dict],
+        semaphore: asyncio.Semaphore
+    ) -> dict[str, dict]:
+        """Get yield predictions for parcels, batched when the API supports it."""
+        if not parcels:
+            return {}
+
+        try:
+            predictions = await self.get_yield_predictions_batch(
+                [(parcel["x_ngsi_id"], parcel.get("x_crop_type")) for parcel in parcels]
+            )
+            if predictions is not None:
+                return predictions
+            logger.info("Batch yield endpoint unavailable, requesting per parcel")
+        except Exception as e:
+            logger.warning("Batch yield prediction failed, requesting per parcel: %s", e)
+
+        results = await asyncio.gather(*(
+            self._fetch_yield_prediction(parcel, semaphore)
+            for parcel in parcels
+        ))
+        return {
+            parcel["x_ngsi_id"]: prediction
+            for parcel, prediction in zip(parcels, results)
+            if prediction is not None
+        }
+
+    async def _fetch_yield_prediction(
+        self,
+        parcel: dict,
+        semaphore: asyncio.Semaphore
+    ) -> Optional[dict]:
+        """Get the yield prediction for one parcel, or None on failure."""
+        async with semaphore:
+            try:
+                return await self.get_yield_prediction(
+                    parcel["x_ngsi_id"],
+                    parcel.get("x_crop_type")
+                )
+            except Exception as e:
+                logger.warning("Failed to get prediction for %s: %s", parcel['name'], e)
+                return None
+
+    async def _fetch_energy_forecast(
+        self,
+        installation: dict,
+        semaphore: asyncio.Semaphore
+    ) -> Optional[dict]:
+        """Get the energy forecast for one installation, or None on failure."""
+        async with semaphore:
+            try:
+                return await self.get_energy_forecast(
+                    installation["x_ngsi_id"],
+                    days=7
+                )
+            except Exception as e:
+                logger.warning("Failed to get forecast for %s: %s", installation['name'], e)
+                return None
+
+    async def _save_odoo_predictions(
         self,
         db_name: str,
         odoo: OdooClient,
-        record_id: int,
         prediction_type: str,
-        data: dict
+        predictions: dict[int, dict]
     ):
         """
-        Update or create prediction record in Odoo.
+        Create or update today's prediction records in Odoo.
 
-        This creates a custom record to store AI predictions.
+        One search finds the records that already exist; all new records
+        are created in a single call.
+
+        Args:
+            db_name: Odoo database name
+            odoo: Odoo client
+            prediction_type: Prediction type (yield, energy)
+            predictions: Prediction data keyed by target record ID
         """
+        if not predictions:
+            return
+
         # Check if prediction model exists (custom module may need to be installed)
         try:
-            prediction_vals = {
-                "name": f"{prediction_type.capitalize()} Prediction - {datetime.now().strftime('%Y-%m-%d')}",
-                "prediction_type": prediction_type,
-                "target_id": record_id,
-                "prediction_date": datetime.now().strftime("%Y-%m-%d"),
-                "prediction_data": str(data),
-                "confidence": data.get("confidence", 0),
-                "expected_value": data.get("expected_value") or data.get("total_kwh", 0)
-            }
+            today = datetime.now().strftime("%Y-%m-%d")
+            name = f"{prediction_type.capitalize()} Prediction - {today}"
 
-            # Look for existing prediction
             existing = await odoo.search_records(
                 db_name,
                 "x.prediction",
                 [
-                    ["target_id", "=", record_id],
+                    ["target_id", "in", list(predictions)],
                     ["prediction_type", "=", prediction_type],
-                    ["prediction_date", "=", prediction_vals["prediction_date"]]
+                    ["prediction_date", "=", today]
                 ],
-                fields=["id"],
-                limit=1
+                fields=["id", "target_id"]
             )
+            # target_id is returned as [id, name] for many2one fields
+            existing_map = {
+                (rec["target_id"][0] if isinstance(rec["target_id"], list) else rec["target_id"]): rec["id"]
+                for rec in existing
+            }
 
-            if existing:
-                await odoo.update_record(db_name, "x.prediction", existing[0]["id"], prediction_vals)
-            else:
-                await odoo.create_record(db_name, "x.prediction", prediction_vals)
+            new_vals = []
+            for record_id, data in predictions.items():
+                prediction_vals = {
+                    "name": name,
+                    "prediction_type": prediction_type,
+                    "target_id": record_id,
+                    "prediction_date": today,
+                    "prediction_data": str(data),
+                    "confidence": data.get("confidence", 0),
+                    "expected_value": data.get("expected_value") or data.get("total_kwh", 0)
+                }
+
+                if record_id in existing_map:
+                    # Values differ per record, so updates can't share one write
+                    await odoo.update_record(db_name, "x.prediction", existing_map[record_id], prediction_vals)
+                else:
+                    new_vals.append(prediction_vals)
+
+            if new_vals:
+                await odoo.create_records(db_name, "x.prediction", new_vals)
 
         except Exception as e:
             # Prediction model might not exist, that's OK
-            logger.debug(f"Could not save prediction to Odoo: {e}")
+            logger.debug("Could not save predictions to Odoo: %s", e)
 
     async def request_analysis(
         self,
@@ -251,22 +371,57 @@ class IntelligenceIntegration:
         Returns:
             Analysis request ID and status
         """
-        logger.info(f"Requesting {analysis_type} analysis for: {entity_id}")
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.intelligence_url}/api/intelligence/analyze",
-                json={
-                    "entity_id": entity_id,
-                    "analysis_type": analysis_type,
-                    "parameters": parameters or {},
-                    "tenant_id": self.tenant_id
-                },
-                timeout=30.0
-            )
+        logger.info("Requesting %s analysis for: %s", analysis_type, entity_id)
+
+        response = await self._client.post(
+            "/api/intelligence/analyze",
+            content=orjson.dumps({
+                "entity_id": entity_id,
+                "analysis_type": analysis_type,
+                "parameters": parameters or {},
+                "tenant_id": self.tenant_id
+            }),
+            headers={"Content-Type": "application/json"}
+        )
+
+        if response.status_code in [200, 202]:
+            return orjson.loads(response.content)
+        else:
+            logger.error("Analysis request failed: %s", response.status_code)
+            raise Exception(f"Analysis request failed: {response.text}")
+
+
+async def _run_prediction_sync(tenant_id: str):
+    """Run a prediction sync, recording failures in the tenant's sync status."""
+    try:
+        await IntelligenceIntegration(tenant_id).sync_predictions_to_odoo()
+    except Exception as e:
+        logger.error("Background prediction sync failed for tenant %s: %s", tenant_id, e)
+        try:
+            await add_sync_error(tenant_id, f"Prediction sync failed: {e}")
+        except Exception as db_error:
+            logger.error("Failed to record prediction sync error: %s", db_error)
+
+
+def start_prediction_sync(tenant_id: str) -> str:
+    """
+    Start a prediction sync in the background without waiting for it.
+
+    A tenant has at most one prediction sync running; further calls
+    return the running job's ID.
+
+    Args:
+        tenant_id: Tenant ID
+
+    Returns:
+        Job ID of the running sync
+    """
+    job = _prediction_jobs.get(tenant_id)
+    if job is not None:
+        return job[0]
 
-            if response.status_code in [200, 202]:
-                return response.json()
-            else:
-                logger.error(f"Analysis request failed: {response.status_code}")
-                raise Exception(f"Analysis request failed: {response.text}")
+    job_id = uuid.uuid4().hex
+    task = asyncio.create_task(_run_prediction_sync(tenant_id))
+    _prediction_jobs[tenant_id] = (job_id, task)
+    task.add_done_callback(lambda _: _prediction_jobs.pop(tenant_id, None))
+    return job_id
@@ -10,19 +10,45 @@ License: AGPL-3.0
 
 import logging
 from typing import Any, Optional
-from datetime import datetime
-import httpx
+from datetime import date, datetime, timezone
+from functools import lru_cache
+import orjson
+from cachetools import TTLCache
 
 from app.config import settings
-from app.services.odoo_client import OdooClient
-from app.services.database import get_tenant_odoo_info
+from app.services.http_client import get_http_client
+from app.services.odoo_client import OdooClient, get_odoo_client
+from app.services.database import get_tenant_odoo_database
 
 logger = logging.getLogger(__name__)
 
+# Partner IDs by (database, email); workflows usually bill the same customers
+_partner_cache: TTLCache = TTLCache(maxsize=4096, ttl=300)
+
+
+@lru_cache(maxsize=1)
+def _format_date(day: date) -> str:
+    """Format a date as YYYY-MM-DD (cached for the current day)."""
+    return day.isoformat()
+
+
+def _today_iso() -> str:
+    """Today's local date as YYYY-MM-DD."""
+    return _format_date(date.today())
+
 
 class N8NIntegration:
     """Service for N8N workflow integration."""
 
+    # Event type -> handler method name
+    _HANDLERS: dict[str, str] = {
+        "odoo.invoice.create": "_handle_invoice_create",
+        "odoo.order.create": "_handle_order_create",
+        "odoo.energy.log": "_handle_energy_log",
+        "odoo.product.update": "_handle_product_update",
+        "sync.request": "_handle_sync_request"
+    }
+
     def __init__(self, tenant_id: str):
         """
         Initialize N8N integration for a tenant.
@@ -35,10 +61,10 @@ class N8NIntegration:
 
     async def _get_odoo_database(self) -> str:
         """Get Odoo database name for tenant."""
-        info = await get_tenant_odoo_info(self.tenant_id)
-        if not info:
+        db_name = await get_tenant_odoo_database(self.tenant_id)
+        if not db_name:
             raise ValueError(f"No Odoo configured for tenant: {self.tenant_id}")
-        return info.get("database", f"nkz_odoo_{self.tenant_id}")
+        return db_name
 
     async def handle_event(
         self,
@@ -59,29 +85,84 @@ class N8NIntegration:
         Returns:
             Result of the operation
         """
-        logger.info(f"Handling N8N event: {event} (workflow: {workflow_id})")
-
-        handlers = {
-            "odoo.invoice.create": self._handle_invoice_create,
-            "odoo.order.create": self._handle_order_create,
-            "odoo.energy.log": self._handle_energy_log,
-            "odoo.product.update": self._handle_product_update,
-            "sync.request": self._handle_sync_request
-        }
+        logger.info("Handling N8N event: %s (workflow: %s)", event, workflow_id)
 
-        handler = handlers.get(event)
-        if not handler:
-            logger.warning(f"Unknown event type: {event}")
+        handler_name = self._HANDLERS.get(event)
+        if handler_name is None:
+            logger.warning("Unknown event type: %s", event)
             return {"status": "ignored", "reason": f"Unknown event: {event}"}
 
         try:
-            result = await handler(data)
+            result = await getattr(self, handler_name)(data)
             return {"status": "success", "result": result}
 
         except Exception as e:
-            logger.error(f"Failed to handle event {event}: {e}")
+            logger.error("Failed to handle event %s: %s", event, e)
             return {"status": "error", "error": str(e)}
 
+    async def _resolve_partner_id(
+        self,
+        db_name: str,
+        odoo: OdooClient,
+        data: dict
+    ) -> Optional[int]:
+        """Get the partner ID from the payload, or look it up by email."""
+        partner_id = data.get("partner_id")
+        email = data.get("partner_email")
+        if partner_id or not email:
+            return partner_id
+
+        cache_key = (db_name, email)
+        partner_id = _partner_cache.get(cache_key)
+        if partner_id is not None:
+            return partner_id
+
+        partners = await odoo.search_records(
+            db_name,
+            "res.partner",
+            [["email", "=", email]],
+            fields=["id"],
+            limit=1
+        )
+        if not partners:
+            return None
+
+        partner_id = _partner_cache[cache_key] = partners[0]["id"]
+        return partner_id
+
+    async def _resolve_product_ids(
+        self,
+        db_name: str,
+        odoo: OdooClient,
+        lines: list[dict]
+    ) -> dict[str, int]:
+        """
+        Look up products by name for lines that only give a product_name.
+
+        All names are resolved with a single search.
+
+        Returns:
+            Product ID by product name (first match per name)
+        """
+        names = {
+            line["product_name"] for line in lines
+            if not line.get("product_id") and line.get("product_name")
+        }
+        if not names:
+            return {}
+
+        products = await odoo.search_records(
+            db_name,
+            "product.product",
+            [["name", "in", list(names)]],
+            fields=["id", "name"]
+        )
+
+        product_ids: dict[str, int] = {}
+        for product in products:
+            product_ids.setdefault(product["name"], product["id"])
+        return product_ids
+
     async def _handle_invoice_create(self, data: dict) -> dict:
         """
         Create an invoice in Odoo.
@@ -94,38 +175,21 @@ class N8NIntegration:
         logger.info("Creating invoice in Odoo from N8N")
 
         db_name = await self._get_odoo_database()
-        odoo = OdooClient()
+        odoo = get_odoo_client()
 
         # Find or create partner
-        partner_id = data.get("partner_id")
-        if not partner_id and data.get("partner_email"):
-            partners = await odoo.search_records(
-                db_name,
-                "res.partner",
-                [["email", "=", data["partner_email"]]],
-                fields=["id"],
-                limit=1
-            )
-            partner_id = partners[0]["id"] if partners else None
+        partner_id = await self._resolve_partner_id(db_name, odoo, data)
 
         if not partner_id:
             raise ValueError("Partner not found")
 
         # Prepare invoice lines
-        invoice_lines = []
-        for line in data.get("lines", []):
-            product_id = line.get("product_id")
-            if not product_id and line.get("product_name"):
-                # Find product by name
-                products = await odoo.search_records(
-                    db_name,
-                    "product.product",
-                    [["name", "=", line["product_name"]]],
-                    fields=["id"],
-                    limit=1
-                )
-                product_id = products[0]["id"] if products else None
+        lines = data.get("lines", [])
+        product_ids = await self._resolve_product_ids(db_name, odoo, lines)
 
+        invoice_lines = []
+        for line in lines:
+            product_id = line.get("product_id") or product_ids.get(line.get("product_name"))
             invoice_lines.append((0, 0, {
                 "product_id": product_id,
                 "name": line.get("description", line.get("product_name", "Service")),
@@ -138,12 +202,12 @@ class N8NIntegration:
             "move_type": "out_invoice",
             "partner_id": partner_id,
             "invoice_line_ids": invoice_lines,
-            "invoice_date": data.get("date_invoice", datetime.now().strftime("%Y-%m-%d"))
+            "invoice_date": data.get("date_invoice") or _today_iso()
         }
 
         invoice_id = await odoo.create_record(db_name, "account.move", invoice_vals)
 
-        logger.info(f"Created invoice: {invoice_id}")
+        logger.info("Created invoice: %s", invoice_id)
         return {"invoice_id": invoice_id}
 
     async def _handle_order_create(self, data: dict) -> dict:
@@ -157,37 +221,21 @@ class N8NIntegration:
         logger.info("Creating sales order in Odoo from N8N")
 
         db_name = await self._get_odoo_database()
-        odoo = OdooClient()
+        odoo = get_odoo_client()
 
         # Find partner
-        partner_id = data.get("partner_id")
-        if not partner_id and data.get("partner_email"):
-            partners = await odoo.search_records(
-                db_name,
-                "res.partner",
-                [["email", "=", data["partner_email"]]],
-                fields=["id"],
-                limit=1
-            )
-            partner_id = partners[0]["id"] if partners else None
+        partner_id = await self._resolve_partner_id(db_name, odoo, data)
 
         if not partner_id:
             raise ValueError("Partner not found")
 
         # Prepare order lines
-        order_lines = []
-        for line in data.get("lines", []):
-            product_id = line.get("product_id")
-            if not product_id and line.get("product_name"):
-                products = await odoo.search_records(
-                    db_name,
-                    "product.product",
-                    [["name", "=", line["product_name"]]],
-                    fields=["id"],
-                    limit=1
-                )
-                product_id = products[0]["id"] if products else None
+        lines = data.get("lines", [])
+        product_ids = await self._resolve_product_ids(db_name, odoo, lines)
 
+        order_lines = []
+        for line in lines:
+            product_id = line.get("product_id") or product_ids.get(line.get("product_name"))
             order_lines.append((0, 0, {
                 "product_id": product_id,
                 "name": line.get("description", ""),
@@ -203,7 +251,7 @@ class N8NIntegration:
 
         order_id = await odoo.create_record(db_name, "sale.order", order_vals)
 
-        logger.info(f"Created sales order: {order_id}")
+        logger.info("Created sales order: %s", order_id)
         return {"order_id": order_id}
 
     async def _handle_energy_log(self, data: dict) -> dict:
@@ -219,7 +267,7 @@ class N8NIntegration:
         logger.info("Logging energy data in Odoo from N8N")
 
         db_name = await self._get_odoo_database()
-        odoo = OdooClient()
+        odoo = get_odoo_client()
 
         # Find installation or meter
         installation_id = data.get("installation_id")
@@ -234,7 +282,7 @@ class N8NIntegration:
             "installation_id": installation_id,
             "meter_id": meter_id,
             "value": data.get("value", 0),
-            "reading_date": data.get("timestamp", datetime.now().isoformat()),
+            "reading_date": data.get("timestamp") or datetime.now().isoformat(),
             "reading_type": data.get("type", "production")
         }
 
@@ -243,11 +291,11 @@ class N8NIntegration:
 
         try:
             reading_id = await odoo.create_record(db_name, model, reading_vals)
-            logger.info(f"Created energy reading: {reading_id}")
+            logger.info("Created energy reading: %s", reading_id)
             return {"reading_id": reading_id}
 
         except Exception as e:
-            logger.warning(f"Energy reading model may not exist: {e}")
+            logger.warning("Energy reading model may not exist: %s", e)
             return {"status": "skipped", "reason": "Energy module not installed"}
 
     async def _handle_product_update(self, data: dict) -> dict:
@@ -261,7 +309,7 @@ class N8NIntegration:
         logger.info("Updating product in Odoo from N8N")
 
         db_name = await self._get_odoo_database()
-        odoo = OdooClient()
+        odoo = get_odoo_client()
 
         product_id = data.get("product_id")
 
@@ -286,7 +334,7 @@ class N8NIntegration:
             data.get("values", {})
         )
 
-        logger.info(f"Updated product: {product_id}")
+        logger.info("Updated product: %s", product_id)
         return {"product_id": product_id}
 
     async def _handle_sync_request(self, data: dict) -> dict:
@@ -333,21 +381,22 @@ class N8NIntegration:
         Returns:
             N8N response
         """
-        logger.info(f"Triggering N8N workflow: {webhook_url}")
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                webhook_url,
-                json={
-                    "tenant_id": self.tenant_id,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    **payload
-                },
-                timeout=30.0
-            )
+        logger.info("Triggering N8N workflow: %s", webhook_url)
+
+        client = get_http_client()
+        response = await client.post(
+            webhook_url,
+            content=orjson.dumps({
+                "tenant_id": self.tenant_id,
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                **payload
+            }),
+            headers={"Content-Type": "application/json"},
+            timeout=30.0
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"N8N webhook failed: {response.status_code}")
-                raise Exception(f"N8N webhook failed: {response.text}")
+        if response.status_code == 200:
+            return orjson.loads(response.content)
+        else:
+            logger.error("N8N webhook failed: %s", response.status_code)
+            raise Exception(f"N8N webhook failed: {response.text}")
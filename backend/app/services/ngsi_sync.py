@@ -9,22 +9,39 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+import asyncio
 import logging
-from typing import Optional, Any
-from datetime import datetime
-import httpx
+from typing import Optional, Any, AsyncIterator, Callable
+from datetime import datetime, timezone
+import orjson
+from cachetools import TTLCache
 
 from app.config import settings
-from app.services.odoo_client import OdooClient
+from app.services.http_client import get_http_client
+from app.services.odoo_client import get_odoo_client
 from app.services.database import (
-    get_tenant_odoo_info,
+    get_tenant_odoo_database,
     get_entity_mapping_by_ngsi_id,
-    create_entity_mapping
+    get_entity_mappings_by_ngsi_ids,
+    create_entity_mapping,
+    create_entity_mappings_bulk
 )
 
 logger = logging.getLogger(__name__)
 
 
+# Max entity syncs in flight at once during a batch/full sync
+_SYNC_CONCURRENCY = 32
+
+# Entities fetched per Orion-LD request during a full sync
+_ENTITY_PAGE_SIZE = 200
+
+# (ETag, entity) by (tenant, entity ID), for conditional re-fetches
+_entity_etag_cache: TTLCache = TTLCache(maxsize=4096, ttl=600)
+
+# res.country ID by ISO code, per Odoo database
+_country_ids_cache: TTLCache = TTLCache(maxsize=256, ttl=3600)
+
 # Mapping from NGSI-LD types to Odoo models
 NGSI_TO_ODOO_MODEL = {
     "AgriParcel": "product.template",
@@ -35,6 +52,155 @@ NGSI_TO_ODOO_MODEL = {
     "WeatherStation": "maintenance.equipment"
 }
 
+# Lowercased type used as the suffix of our subscription IDs
+_SUB_ID_SUFFIXES = {entity_type: entity_type.lower() for entity_type in NGSI_TO_ODOO_MODEL}
+
+# Synced NGSI-LD types, in a fixed order for full syncs and subscriptions
+_NGSI_TYPES: tuple[str, ...] = tuple(NGSI_TO_ODOO_MODEL)
+
+# Shared stand-in for missing dict properties; never mutated
+_EMPTY_DICT: dict = {}
+
+
+def _build_mapping(
+    entity: dict,
+    odoo_model: str,
+    odoo_id: int,
+    odoo_values: dict,
+    last_sync: datetime
+) -> dict:
+    """Build the odoo_entity_mappings row for a synced entity."""
+    entity_id = entity.get("id")
+    return {
+        "ngsi_id": entity_id,
+        "ngsi_type": entity.get("type"),
+        "odoo_id": odoo_id,
+        "odoo_model": odoo_model,
+        "odoo_name": odoo_values.get("name", entity_id),
+        "last_sync": last_sync  # TIMESTAMPTZ needs a datetime, not a string
+    }
+
+
+def _update_values(entity: dict, odoo_values: dict) -> dict:
+    """
+    Values to write to an entity's existing Odoo record.
+
+    Leaves out the per-entity fields that don't change on update, so
+    entities with the same property values share one multi-id write:
+    x_ngsi_id (already on the record, found through it) and name when it
+    is only the entity ID fallback.
+    """
+    values = dict(odoo_values)
+    del values["x_ngsi_id"]
+    if not _get_property_value(entity, "name"):
+        values.pop("name", None)
+    return values
+
+
+def _get_property_value(entity: dict, property_name: str, default: Any = None) -> Any:
+    """
+    Get value from NGSI-LD property.
+
+    Handles both simple values and Property objects.
+    """
+    prop = entity.get(property_name)
+
+    if prop is None:
+        return default
+
+    return _unwrap_property(prop)
+
+
+def _unwrap_property(prop: Any) -> Any:
+    """Unwrap an NGSI-LD Property object, passing simple values through."""
+    if type(prop) is dict:
+        # NGSI-LD Property format; "value" is by far the common case
+        try:
+            return prop["value"]
+        except KeyError:
+            return prop.get("@value", prop)
+
+    return prop
+
+
+def _or_default(default: Any) -> Callable[[Any], Any]:
+    """Coercer substituting a default for a missing property."""
+    return lambda value: default if value is None else value
+
+
+def _address_part(key: str) -> Callable[[Any], Any]:
+    """Coercer picking one field out of an NGSI-LD address property."""
+    return lambda address: (address or _EMPTY_DICT).get(key)
+
+
+# Per NGSI-LD type: (ngsi_property, odoo_field, optional coercer)
+FIELD_MAPS: dict[str, list[tuple[str, str, Optional[Callable[[Any], Any]]]]] = {
+    "AgriParcel": [
+        ("description", "description", None),
+        ("area", "x_area", None),
+        ("cropType", "x_crop_type", None),
+        ("location", "x_location", str)
+    ],
+    "Device": [
+        ("serialNumber", "serial_no", None),
+        ("description", "note", None),
+        ("deviceType", "x_device_type", None),
+        ("status", "x_status", None)
+    ],
+    "EnergyMeter": [
+        ("meterCode", "code", None),
+        ("meterType", "meter_type", _or_default("production")),
+        ("cups", "x_cups", None)
+    ],
+    "SolarPanel": [
+        ("peakPower", "power_peak", None),
+        ("orientation", "x_orientation", None),
+        ("tilt", "x_tilt", None)
+    ],
+    "Building": [
+        ("address", "street", _address_part("streetAddress")),
+        ("address", "city", _address_part("addressLocality")),
+        ("address", "zip", _address_part("postalCode")),
+        # Country code; resolved to a res.country ID in _transform_to_odoo
+        ("address", "country_id", _address_part("addressCountry"))
+    ]
+}
+
+# Per NGSI-LD type: fixed Odoo field values
+FIELD_CONSTANTS: dict[str, dict] = {
+    "AgriParcel": {
+        "type": "product",
+        "categ_id": 1  # Default category, should be configured
+    },
+    "SolarPanel": {"installation_type": "solar"},
+    "Building": {"is_company": True}
+}
+
+
+def _apply_map(entity: dict, mapping: list[tuple[str, str, Optional[Callable[[Any], Any]]]]) -> dict:
+    """
+    Build Odoo field values from an entity using a FIELD_MAPS entry.
+
+    Args:
+        entity: NGSI-LD entity
+        mapping: (ngsi_property, odoo_field, coercer) tuples
+
+    Returns:
+        Dict of Odoo field values
+    """
+    get = entity.get
+    values = {}
+    for property_name, field, coerce in mapping:
+        value = get(property_name)
+        if value is not None:
+            value = _unwrap_property(value)
+        values[field] = coerce(value) if coerce else value
+    return values
+
+
+class EntityFetchError(Exception):
+    """Orion-LD did not return a page of entities."""
+
 
 class NgsildSyncService:
     """Service for syncing NGSI-LD entities with Odoo."""
@@ -49,12 +215,18 @@ class NgsildSyncService:
         self.tenant_id = tenant_id
         self.orion_url = settings.ORION_URL
 
+        # Headers for Orion-LD reads, reused by every fetch
+        self._fetch_headers = {
+            "Accept": "application/ld+json",
+            "NGSILD-Tenant": tenant_id
+        }
+
     async def _get_odoo_database(self) -> str:
         """Get Odoo database name for tenant."""
-        info = await get_tenant_odoo_info(self.tenant_id)
-        if not info:
+        db_name = await get_tenant_odoo_database(self.tenant_id)
+        if not db_name:
             raise ValueError(f"No Odoo configured for tenant: {self.tenant_id}")
-        return info.get("database", f"nkz_odoo_{self.tenant_id}")
+        return db_name
 
     async def fetch_entity(self, entity_id: str) -> Optional[dict]:
         """
@@ -67,52 +239,76 @@ class NgsildSyncService:
             Entity data or None if not found
         """
         url = f"{self.orion_url}/ngsi-ld/v1/entities/{entity_id}"
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                headers={
-                    "Accept": "application/ld+json",
-                    "NGSILD-Tenant": self.tenant_id
-                }
-            )
-
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                return None
-            else:
-                logger.error(f"Failed to fetch entity {entity_id}: {response.status_code}")
-                raise Exception(f"Failed to fetch entity: {response.text}")
-
-    async def fetch_entities_by_type(self, entity_type: str) -> list[dict]:
+        cache_key = (self.tenant_id, entity_id)
+        cached = _entity_etag_cache.get(cache_key)
+
+        headers = self._fetch_headers
+        if cached:
+            headers = {**headers, "If-None-Match": cached[0]}
+
+        client = get_http_client()
+        response = await client.get(url, headers=headers)
+
+        if response.status_code == 304 and cached:
+            return cached[1]
+        elif response.status_code == 200:
+            entity = orjson.loads(response.content)
+            etag = response.headers.get("ETag")
+            if etag:
+                _entity_etag_cache[cache_key] = (etag, entity)
+            return entity
+        elif response.status_code == 404:
+            _entity_etag_cache.pop(cache_key, None)
+            return None
+        else:
+            logger.error("Failed to fetch entity %s: %s", entity_id, response.status_code)
+            raise Exception(f"Failed to fetch entity: {response.text}")
+
+    async def stream_entities_by_type(
+        self,
+        entity_type: str,
+        page_size: int = _ENTITY_PAGE_SIZE
+    ) -> AsyncIterator[list[dict]]:
         """
-        Fetch all entities of a type from Orion-LD.
+        Fetch all entities of a type from Orion-LD, one page at a time.
+
+        Pages use limit/offset, which Orion-LD does not tie to a stable
+        order: entities created or deleted while paging can shift later
+        pages, so an entity may be skipped or returned twice. A later sync
+        (or its notification) picks up anything skipped.
 
         Args:
             entity_type: NGSI-LD entity type
+            page_size: Entities per request
 
-        Returns:
-            List of entities
+        Yields:
+            Pages of entities
+
+        Raises:
+            EntityFetchError: A page could not be fetched
         """
         url = f"{self.orion_url}/ngsi-ld/v1/entities"
-        params = {"type": entity_type, "limit": 1000}
+        client = get_http_client()
+        offset = 0
 
-        async with httpx.AsyncClient() as client:
+        while True:
             response = await client.get(
                 url,
-                params=params,
-                headers={
-                    "Accept": "application/ld+json",
-                    "NGSILD-Tenant": self.tenant_id
-                }
+                params={"type": entity_type, "limit": page_size, "offset": offset},
+                headers=self._fetch_headers
             )
 
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to fetch entities: {response.status_code}")
-                return []
+            if response.status_code != 200:
+                raise EntityFetchError(
+                    f"Orion-LD returned {response.status_code} for {entity_type} at offset {offset}"
+                )
+
+            page = orjson.loads(response.content)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            offset += page_size
 
     async def sync_entity_to_odoo(self, entity: dict) -> dict:
         """
@@ -129,7 +325,7 @@ class NgsildSyncService:
         entity_id = entity.get("id")
         entity_type = entity.get("type")
 
-        logger.info(f"Syncing entity {entity_id} ({entity_type}) to Odoo")
+        logger.debug("Syncing entity %s (%s) to Odoo", entity_id, entity_type)
 
         # Get Odoo model
         odoo_model = NGSI_TO_ODOO_MODEL.get(entity_type)
@@ -138,13 +334,14 @@ class NgsildSyncService:
 
         # Get Odoo database
         db_name = await self._get_odoo_database()
-        odoo_client = OdooClient()
+        odoo_client = get_odoo_client()
 
         # Check if mapping exists
         existing = await get_entity_mapping_by_ngsi_id(self.tenant_id, entity_id)
 
         # Transform entity to Odoo values
-        odoo_values = self._transform_to_odoo(entity, odoo_model)
+        country_ids = await self._load_country_ids(db_name) if entity_type == "Building" else None
+        odoo_values = self._transform_to_odoo(entity, odoo_model, country_ids)
 
         if existing:
             # Update existing record
@@ -152,10 +349,10 @@ class NgsildSyncService:
                 db_name,
                 odoo_model,
                 existing["odoo_id"],
-                odoo_values
+                _update_values(entity, odoo_values)
             )
             odoo_id = existing["odoo_id"]
-            logger.info(f"Updated Odoo record: {odoo_model}/{odoo_id}")
+            logger.debug("Updated Odoo record: %s/%s", odoo_model, odoo_id)
 
         else:
             # Create new record
@@ -164,17 +361,13 @@ class NgsildSyncService:
                 odoo_model,
                 odoo_values
             )
-            logger.info(f"Created Odoo record: {odoo_model}/{odoo_id}")
+            logger.debug("Created Odoo record: %s/%s", odoo_model, odoo_id)
 
         # Update mapping
-        await create_entity_mapping(self.tenant_id, {
-            "ngsi_id": entity_id,
-            "ngsi_type": entity_type,
-            "odoo_id": odoo_id,
-            "odoo_model": odoo_model,
-            "odoo_name": odoo_values.get("name", entity_id),
-            "last_sync": datetime.utcnow().isoformat()
-        })
+        await create_entity_mapping(
+            self.tenant_id,
+            _build_mapping(entity, odoo_model, odoo_id, odoo_values, datetime.now(timezone.utc))
+        )
 
         return {
             "id": odoo_id,
@@ -182,6 +375,122 @@ class NgsildSyncService:
             "name": odoo_values.get("name", entity_id)
         }
 
+    async def sync_entities_to_odoo(
+        self,
+        entities: list[dict],
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> list[Optional[BaseException]]:
+        """
+        Sync several NGSI-LD entities to Odoo with batched calls.
+
+        New records are created with one multi-record create per Odoo
+        model, and existing records sharing identical values are updated
+        with one multi-id write. Mappings are looked up and saved in bulk.
+
+        Args:
+            entities: NGSI-LD entities
+            semaphore: Bounds concurrent Odoo calls (shared across calls
+                during a full sync)
+
+        Returns:
+            Per-entity error, or None where the entity synced
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(_SYNC_CONCURRENCY)
+
+        # Mappings are only saved after the batch, so an entity listed twice
+        # would be created twice; sync just its latest version.
+        latest = {entity.get("id"): entity for entity in entities}
+        outcome: dict[Any, Optional[BaseException]] = {}
+
+        db_name = await self._get_odoo_database()
+        existing = await get_entity_mappings_by_ngsi_ids(self.tenant_id, list(latest))
+
+        country_ids = None
+        if any(entity.get("type") == "Building" for entity in latest.values()):
+            country_ids = await self._load_country_ids(db_name)
+
+        # model -> [(entity, values)], and
+        # (model, update values) -> (update values, [(entity, values, odoo_id)])
+        to_create: dict[str, list[tuple[dict, dict]]] = {}
+        to_update: dict[tuple[str, bytes], tuple[dict, list[tuple[dict, dict, int]]]] = {}
+
+        for entity_id, entity in latest.items():
+            entity_type = entity.get("type")
+            odoo_model = NGSI_TO_ODOO_MODEL.get(entity_type)
+            if not odoo_model:
+                outcome[entity_id] = ValueError(f"Unsupported entity type: {entity_type}")
+                continue
+
+            try:
+                odoo_values = self._transform_to_odoo(entity, odoo_model, country_ids)
+                mapping = existing.get(entity_id)
+                if mapping:
+                    update_values = _update_values(entity, odoo_values)
+                    key = (odoo_model, orjson.dumps(update_values, option=orjson.OPT_SORT_KEYS))
+            except Exception as e:
+                outcome[entity_id] = e
+                continue
+
+            if mapping:
+                to_update.setdefault(key, (update_values, []))[1].append(
+                    (entity, odoo_values, mapping["odoo_id"])
+                )
+            else:
+                to_create.setdefault(odoo_model, []).append((entity, odoo_values))
+
+        odoo_client = get_odoo_client()
+        now = datetime.now(timezone.utc)
+        mappings = []
+
+        async def create_group(odoo_model: str, items: list[tuple[dict, dict]]):
+            try:
+                async with semaphore:
+                    odoo_ids = await odoo_client.create_records(
+                        db_name, odoo_model, [values for _, values in items]
+                    )
+            except Exception as e:
+                for entity, _ in items:
+                    outcome[entity.get("id")] = e
+                return
+
+            logger.info("Created %s Odoo %s records", len(odoo_ids), odoo_model)
+            for (entity, values), odoo_id in zip(items, odoo_ids):
+                mappings.append(_build_mapping(entity, odoo_model, odoo_id, values, now))
+                outcome[entity.get("id")] = None
+
+        async def update_group(
+            odoo_model: str,
+            update_values: dict,
+            items: list[tuple[dict, dict, int]]
+        ):
+            try:
+                async with semaphore:
+                    await odoo_client.update_records(
+                        db_name, odoo_model, [odoo_id for _, _, odoo_id in items], update_values
+                    )
+            except Exception as e:
+                for entity, _, _ in items:
+                    outcome[entity.get("id")] = e
+                return
+
+            logger.info("Updated %s Odoo %s records", len(items), odoo_model)
+            for entity, values, odoo_id in items:
+                mappings.append(_build_mapping(entity, odoo_model, odoo_id, values, now))
+                outcome[entity.get("id")] = None
+
+        await asyncio.gather(
+            *(create_group(odoo_model, items) for odoo_model, items in to_create.items()),
+            *(
+                update_group(key[0], update_values, items)
+                for key, (update_values, items) in to_update.items()
+            )
+        )
+
+        await create_entity_mappings_bulk(self.tenant_id, mappings)
+
+        return [outcome[entity.get("id")] for entity in entities]
+
     async def sync_odoo_to_ngsi(self, odoo_model: str, odoo_id: int):
         """
         Sync an Odoo record back to NGSI-LD.
@@ -194,7 +503,7 @@ class NgsildSyncService:
         """
         # This is for reverse sync when Odoo records are modified
         # Implementation depends on which fields should be synced back
-        logger.info(f"Reverse sync requested: {odoo_model}/{odoo_id}")
+        logger.info("Reverse sync requested: %s/%s", odoo_model, odoo_id)
 
         # TODO: Implement reverse sync if needed
         # For now, we only sync NGSI-LD -> Odoo
@@ -207,41 +516,73 @@ class NgsildSyncService:
         Returns:
             Sync result with counts
         """
-        logger.info(f"Starting full sync for tenant: {self.tenant_id}")
+        logger.info("Starting full sync for tenant: %s", self.tenant_id)
+
+        semaphore = asyncio.Semaphore(_SYNC_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self._sync_entity_type(entity_type, semaphore) for entity_type in _NGSI_TYPES),
+            return_exceptions=True
+        )
 
         synced = 0
         errors = []
 
-        for entity_type in NGSI_TO_ODOO_MODEL.keys():
-            try:
-                entities = await self.fetch_entities_by_type(entity_type)
-                logger.info(f"Found {len(entities)} {entity_type} entities")
-
-                for entity in entities:
-                    try:
-                        await self.sync_entity_to_odoo(entity)
-                        synced += 1
-                    except Exception as e:
-                        error_msg = f"Failed to sync {entity.get('id')}: {str(e)}"
-                        logger.error(error_msg)
-                        errors.append(error_msg)
-
-            except Exception as e:
-                error_msg = f"Failed to fetch {entity_type}: {str(e)}"
+        for entity_type, result in zip(_NGSI_TYPES, results):
+            if isinstance(result, BaseException):
+                error_msg = f"Failed to fetch {entity_type}: {str(result)}"
                 logger.error(error_msg)
                 errors.append(error_msg)
+            else:
+                synced += result[0]
+                errors.extend(result[1])
 
-        logger.info(f"Full sync complete: {synced} synced, {len(errors)} errors")
+        logger.info("Full sync complete: %s synced, %s errors", synced, len(errors))
 
         return {"synced": synced, "errors": errors}
 
-    def _transform_to_odoo(self, entity: dict, odoo_model: str) -> dict:
+    async def _sync_entity_type(
+        self,
+        entity_type: str,
+        semaphore: asyncio.Semaphore
+    ) -> tuple[int, list[str]]:
+        """Fetch and sync all entities of one type; returns (synced, errors)."""
+        synced = 0
+        errors = []
+
+        # Sync page by page so only one page per type is held in memory
+        try:
+            async for entities in self.stream_entities_by_type(entity_type):
+                logger.info("Syncing %s %s entities", len(entities), entity_type)
+
+                results = await self.sync_entities_to_odoo(entities, semaphore)
+                for entity, error in zip(entities, results):
+                    if error is None:
+                        synced += 1
+                    else:
+                        error_msg = f"Failed to sync {entity.get('id')}: {str(error)}"
+                        logger.error(error_msg)
+                        errors.append(error_msg)
+        except EntityFetchError as e:
+            # Keep the pages already synced; the rest of the type is missing
+            error_msg = f"Failed to fetch {entity_type}: {e}"
+            logger.error(error_msg)
+            errors.append(error_msg)
+
+        return synced, errors
+
+    def _transform_to_odoo(
+        self,
+        entity: dict,
+        odoo_model: str,
+        country_ids: Optional[dict[str, int]] = None
+    ) -> dict:
         """
         Transform NGSI-LD entity to Odoo record values.
 
         Args:
             entity: NGSI-LD entity
             odoo_model: Target Odoo model
+            country_ids: res.country ID by ISO code (see _load_country_ids)
 
         Returns:
             Dict of Odoo field values
@@ -251,91 +592,47 @@ class NgsildSyncService:
 
         # Base values
         values = {
-            "name": self._get_property_value(entity, "name") or entity_id,
+            "name": _get_property_value(entity, "name") or entity_id,
             "x_ngsi_id": entity_id  # Custom field to store NGSI-LD ID
         }
 
-        # Type-specific transformations
-        if entity_type == "AgriParcel":
-            values.update(self._transform_agri_parcel(entity))
-        elif entity_type == "Device":
-            values.update(self._transform_device(entity))
-        elif entity_type == "EnergyMeter":
-            values.update(self._transform_energy_meter(entity))
-        elif entity_type == "SolarPanel":
-            values.update(self._transform_solar_panel(entity))
-        elif entity_type == "Building":
-            values.update(self._transform_building(entity))
-
-        return values
-
-    def _transform_agri_parcel(self, entity: dict) -> dict:
-        """Transform AgriParcel to product.template."""
-        return {
-            "type": "product",
-            "categ_id": 1,  # Default category, should be configured
-            "description": self._get_property_value(entity, "description"),
-            "x_area": self._get_property_value(entity, "area"),
-            "x_crop_type": self._get_property_value(entity, "cropType"),
-            "x_location": str(self._get_property_value(entity, "location"))
-        }
+        # Type-specific fields
+        values.update(FIELD_CONSTANTS.get(entity_type, ()))
+        mapping = FIELD_MAPS.get(entity_type)
+        if mapping:
+            values.update(_apply_map(entity, mapping))
 
-    def _transform_device(self, entity: dict) -> dict:
-        """Transform Device to maintenance.equipment."""
-        return {
-            "serial_no": self._get_property_value(entity, "serialNumber"),
-            "note": self._get_property_value(entity, "description"),
-            "x_device_type": self._get_property_value(entity, "deviceType"),
-            "x_status": self._get_property_value(entity, "status")
-        }
-
-    def _transform_energy_meter(self, entity: dict) -> dict:
-        """Transform EnergyMeter to energy.meter."""
-        return {
-            "code": self._get_property_value(entity, "meterCode"),
-            "meter_type": self._get_property_value(entity, "meterType", "production"),
-            "x_cups": self._get_property_value(entity, "cups")
-        }
-
-    def _transform_solar_panel(self, entity: dict) -> dict:
-        """Transform SolarPanel to energy.installation."""
-        return {
-            "installation_type": "solar",
-            "power_peak": self._get_property_value(entity, "peakPower"),
-            "x_orientation": self._get_property_value(entity, "orientation"),
-            "x_tilt": self._get_property_value(entity, "tilt")
-        }
+        if "country_id" in values:
+            code = values["country_id"]
+            values["country_id"] = (
+                (country_ids or {}).get(code.upper(), False) if isinstance(code, str) else False
+            )
 
-    def _transform_building(self, entity: dict) -> dict:
-        """Transform Building to res.partner."""
-        address = self._get_property_value(entity, "address") or {}
-        return {
-            "is_company": True,
-            "street": address.get("streetAddress"),
-            "city": address.get("addressLocality"),
-            "zip": address.get("postalCode"),
-            "country_id": False  # Would need to look up country
-        }
+        return values
 
-    def _get_property_value(self, entity: dict, property_name: str, default: Any = None) -> Any:
+    async def _load_country_ids(self, db_name: str) -> dict[str, int]:
         """
-        Get value from NGSI-LD property.
+        Get res.country IDs by ISO code, loaded once per database.
 
-        Handles both simple values and Property objects.
+        Falls back to an empty table (no country set) if Odoo can't be read.
         """
-        prop = entity.get(property_name)
-
-        if prop is None:
-            return default
+        country_ids = _country_ids_cache.get(db_name)
+        if country_ids is not None:
+            return country_ids
 
-        if isinstance(prop, dict):
-            # NGSI-LD Property format
-            if "value" in prop:
-                return prop["value"]
-            elif "@value" in prop:
-                return prop["@value"]
+        try:
+            countries = await get_odoo_client().search_records(
+                db_name, "res.country", [], fields=["id", "code"]
+            )
+        except Exception as e:
+            logger.warning("Failed to load countries from %s: %s", db_name, e)
+            return {}
 
-        return prop
+        country_ids = _country_ids_cache[db_name] = {
+            country["code"].upper(): country["id"]
+            for country in countries if country.get("code")
+        }
+        return country_ids
 
 
 async def register_tenant_subscriptions(tenant_id: str):
@@ -344,13 +641,31 @@ async def register_tenant_subscriptions(tenant_id: str):
 
     Creates subscriptions for all entity types that should sync to Odoo.
     """
-    logger.info(f"Registering NGSI-LD subscriptions for tenant: {tenant_id}")
+    logger.info("Registering NGSI-LD subscriptions for tenant: %s", tenant_id)
 
     webhook_url = f"http://odoo-backend-service/api/odoo/webhook/ngsi"
+    subscriptions_url = f"{settings.ORION_URL}/ngsi-ld/v1/subscriptions"
+    headers = {
+        "Content-Type": "application/ld+json",
+        "NGSILD-Tenant": tenant_id
+    }
+    client = get_http_client()
+
+    async def register(entity_type: str, subscription: dict):
+        response = await client.post(
+            subscriptions_url,
+            content=orjson.dumps(subscription),
+            headers=headers
+        )
+
+        if response.status_code in [201, 409]:  # Created or already exists
+            logger.info("Subscription registered for %s", entity_type)
+        else:
+            logger.warning("Failed to register subscription for %s: %s", entity_type, response.text)
 
-    for entity_type in NGSI_TO_ODOO_MODEL.keys():
-        subscription = {
-            "id": f"urn:ngsi-ld:Subscription:nkz-odoo-{tenant_id}-{entity_type.lower()}",
+    subscriptions = [
+        (entity_type, {
+            "id": f"urn:ngsi-ld:Subscription:nkz-odoo-{tenant_id}-{_SUB_ID_SUFFIXES[entity_type]}",
             "type": "Subscription",
             "entities": [{"type": entity_type}],
             "notification": {
@@ -360,36 +675,31 @@ async def register_tenant_subscriptions(tenant_id: str):
                 }
             },
             "@context": "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"
-        }
+        })
+        for entity_type in _NGSI_TYPES
+    ]
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.ORION_URL}/ngsi-ld/v1/subscriptions",
-                json=subscription,
-                headers={
-                    "Content-Type": "application/ld+json",
-                    "NGSILD-Tenant": tenant_id
-                }
-            )
-
-            if response.status_code in [201, 409]:  # Created or already exists
-                logger.info(f"Subscription registered for {entity_type}")
-            else:
-                logger.warning(f"Failed to register subscription for {entity_type}: {response.text}")
+    await asyncio.gather(*(register(entity_type, sub) for entity_type, sub in subscriptions))
 
 
 async def remove_tenant_subscriptions(tenant_id: str):
     """Remove all NGSI-LD subscriptions for a tenant."""
-    logger.info(f"Removing NGSI-LD subscriptions for tenant: {tenant_id}")
+    logger.info("Removing NGSI-LD subscriptions for tenant: %s", tenant_id)
 
-    for entity_type in NGSI_TO_ODOO_MODEL.keys():
-        sub_id = f"urn:ngsi-ld:Subscription:nkz-odoo-{tenant_id}-{entity_type.lower()}"
+    subscriptions_url = f"{settings.ORION_URL}/ngsi-ld/v1/subscriptions"
+    headers = {"NGSILD-Tenant": tenant_id}
+    client = get_http_client()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"{settings.ORION_URL}/ngsi-ld/v1/subscriptions/{sub_id}",
-                headers={"NGSILD-Tenant": tenant_id}
-            )
+    async def remove(sub_id: str):
+        response = await client.delete(
+            f"{subscriptions_url}/{sub_id}",
+            headers=headers
+        )
+
+        if response.status_code in [204, 404]:
+            logger.info("Subscription removed: %s", sub_id)
 
-            if response.status_code in [204, 404]:
-                logger.info(f"Subscription removed: {sub_id}")
+    await asyncio.gather(*(
+        remove(f"urn:ngsi-ld:Subscription:nkz-odoo-{tenant_id}-{_SUB_ID_SUFFIXES[entity_type]}")
+        for entity_type in _NGSI_TYPES
+    ))
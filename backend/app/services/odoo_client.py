@@ -1,25 +1,64 @@
 """
 Nekazari Odoo ERP Module - Odoo Client
 
-Handles communication with Odoo via XML-RPC and JSON-RPC APIs.
+Handles communication with Odoo via its JSON-RPC API.
 
 Author: Kate Benetis <kate@robotika.cloud>
 Company: Robotika
 License: AGPL-3.0
 """
 
+import itertools
 import logging
-import xmlrpc.client
+from operator import itemgetter
 from typing import Optional, Any
 import httpx
+import orjson
+from cachetools import LRUCache, TTLCache
 
 from app.config import settings
+from app.services.http_client import get_odoo_rpc_client
 
 logger = logging.getLogger(__name__)
 
+# Shared client; record operations only depend on settings, not instance state
+_odoo_client: Optional["OdooClient"] = None
+
+# Authenticated UIDs by (database, username), to skip common.authenticate
+_uid_cache: TTLCache = TTLCache(maxsize=256, ttl=1800)
+
+# Admin clients by database (see OdooClient.get_shared)
+_shared_clients: LRUCache = LRUCache(maxsize=64)
+
+# Whether nekazari_connector is installed, by database (see install_modules)
+_connector_installed: TTLCache = TTLCache(maxsize=256, ttl=1800)
+
+# JSON-RPC request IDs
+_rpc_ids = itertools.count(1)
+
+# Database management calls (duplicate, drop, module install) can take minutes
+_NO_TIMEOUT = httpx.Timeout(None, connect=5.0)
+
+
+# Server-side exception raised for a wrong or outdated login/password
+_ACCESS_DENIED = "odoo.exceptions.AccessDenied"
+
+
+class OdooRPCError(Exception):
+    """Error returned by an Odoo JSON-RPC call."""
+
+    def __init__(self, message: str, name: Optional[str] = None):
+        """
+        Args:
+            message: Error message
+            name: Qualified name of the server-side exception, if given
+        """
+        super().__init__(message)
+        self.name = name
+
 
 class OdooClient:
-    """Client for Odoo XML-RPC and JSON-RPC APIs."""
+    """Client for the Odoo JSON-RPC API."""
 
     def __init__(self, database: Optional[str] = None):
         """
@@ -32,16 +71,55 @@ class OdooClient:
         self.database = database
         self.master_password = settings.ODOO_MASTER_PASSWORD
 
-        # XML-RPC endpoints
-        self.common = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/common")
-        self.models = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object")
-        self.db = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/db")
-
         # Cached UID for authenticated operations
         self._uid: Optional[int] = None
+        self._username: Optional[str] = None
         self._password: Optional[str] = None
+        # Leading execute_kw arguments, fixed once authenticated
+        self._auth_args: Optional[tuple] = None
 
-    def authenticate(self, username: str, password: str) -> int:
+    async def _json_rpc(
+        self,
+        service: str,
+        method: str,
+        args: list,
+        timeout: Any = httpx.USE_CLIENT_DEFAULT
+    ) -> Any:
+        """
+        Call an Odoo service method over JSON-RPC.
+
+        Args:
+            service: Odoo service ('common', 'object' or 'db')
+            method: Service method
+            args: Positional arguments
+            timeout: Request timeout (defaults to the client's)
+
+        Returns:
+            Call result
+        """
+        response = await get_odoo_rpc_client().post(
+            "/jsonrpc",
+            content=orjson.dumps({
+                "jsonrpc": "2.0",
+                "method": "call",
+                "params": {"service": service, "method": method, "args": args},
+                "id": next(_rpc_ids)
+            }),
+            timeout=timeout
+        )
+        response.raise_for_status()
+
+        body = orjson.loads(response.content)
+        error = body.get("error")
+        if error:
+            data = error.get("data") or {}
+            raise OdooRPCError(
+                data.get("message") or error.get("message", "Odoo RPC error"),
+                data.get("name")
+            )
+        return body.get("result")
+
+    async def authenticate(self, username: str, password: str) -> int:
         """
         Authenticate with Odoo and return user ID.
 
@@ -55,21 +133,45 @@ class OdooClient:
         if not self.database:
             raise ValueError("Database must be set for authentication")
 
-        uid = self.common.authenticate(
-            self.database,
-            username,
-            password,
-            {}
-        )
+        cache_key = (self.database, username)
+        uid = _uid_cache.get(cache_key)
+        if uid is None:
+            uid = await self._json_rpc(
+                "common",
+                "authenticate",
+                [self.database, username, password, {}]
+            )
+
+            if not uid:
+                raise ValueError("Authentication failed")
 
-        if not uid:
-            raise ValueError("Authentication failed")
+            _uid_cache[cache_key] = uid
 
         self._uid = uid
+        self._username = username
         self._password = password
+        self._auth_args = (self.database, uid, password)
         return uid
 
-    def execute(
+    @classmethod
+    async def get_shared(cls, db_name: str) -> "OdooClient":
+        """
+        Get the shared admin client for a database.
+
+        Args:
+            db_name: Database name
+
+        Returns:
+            Client authenticated as admin
+        """
+        client = _shared_clients.get(db_name)
+        if client is None:
+            client = cls(database=db_name)
+            await client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+            _shared_clients[db_name] = client
+        return client
+
+    async def execute(
         self,
         model: str,
         method: str,
@@ -88,17 +190,50 @@ class OdooClient:
         Returns:
             Method result
         """
-        if not self._uid or not self._password:
+        return await self._execute(model, method, list(args), kwargs)
+
+    async def _execute(
+        self,
+        model: str,
+        method: str,
+        args: list,
+        kwargs: dict,
+        timeout: Any = httpx.USE_CLIENT_DEFAULT
+    ) -> Any:
+        """
+        Run execute_kw on the object service.
+
+        If Odoo rejects the cached credentials (e.g. the admin password was
+        rotated, or the database was restored under the same name), the
+        cached UID and shared client are dropped and the call is retried
+        once after authenticating again. Odoo checks credentials before
+        running the method, so the retry can't apply it twice.
+        """
+        if self._auth_args is None:
             raise ValueError("Must authenticate first")
 
-        return self.models.execute_kw(
-            self.database,
-            self._uid,
-            self._password,
-            model,
-            method,
-            args,
-            kwargs
+        try:
+            return await self._json_rpc(
+                "object",
+                "execute_kw",
+                [*self._auth_args, model, method, args, kwargs],
+                timeout=timeout
+            )
+        except OdooRPCError as e:
+            if e.name != _ACCESS_DENIED:
+                raise
+
+        logger.warning("Odoo rejected cached credentials for %s, re-authenticating", self.database)
+        _uid_cache.pop((self.database, self._username), None)
+        if _shared_clients.get(self.database) is self:
+            del _shared_clients[self.database]
+        await self.authenticate(self._username, self._password)
+
+        return await self._json_rpc(
+            "object",
+            "execute_kw",
+            [*self._auth_args, model, method, args, kwargs],
+            timeout=timeout
         )
 
     # Database Management
@@ -111,18 +246,19 @@ class OdooClient:
             source_db: Source database name (template)
             target_db: Target database name (new tenant)
         """
-        logger.info(f"Duplicating database: {source_db} -> {target_db}")
+        logger.info("Duplicating database: %s -> %s", source_db, target_db)
 
         try:
-            self.db.duplicate_database(
-                self.master_password,
-                source_db,
-                target_db
+            await self._json_rpc(
+                "db",
+                "duplicate_database",
+                [self.master_password, source_db, target_db],
+                timeout=_NO_TIMEOUT
             )
-            logger.info(f"Database duplicated successfully: {target_db}")
+            logger.info("Database duplicated successfully: %s", target_db)
 
         except Exception as e:
-            logger.error(f"Failed to duplicate database: {e}")
+            logger.error("Failed to duplicate database: %s", e)
             raise
 
     async def delete_database(self, db_name: str):
@@ -132,19 +268,20 @@ class OdooClient:
         Args:
             db_name: Database name to delete
         """
-        logger.warning(f"Deleting database: {db_name}")
+        logger.warning("Deleting database: %s", db_name)
 
         try:
-            self.db.drop(self.master_password, db_name)
-            logger.info(f"Database deleted: {db_name}")
+            await self._json_rpc("db", "drop", [self.master_password, db_name], timeout=_NO_TIMEOUT)
+            _forget_database(db_name)
+            logger.info("Database deleted: %s", db_name)
 
         except Exception as e:
-            logger.error(f"Failed to delete database: {e}")
+            logger.error("Failed to delete database: %s", e)
             raise
 
     async def list_databases(self) -> list[str]:
         """List all databases."""
-        return self.db.list()
+        return await self._json_rpc("db", "list", [])
 
     async def database_exists(self, db_name: str) -> bool:
         """Check if a database exists."""
@@ -161,14 +298,29 @@ class OdooClient:
             db_name: Database name
             modules: List of module technical names to install
         """
-        logger.info(f"Installing modules in {db_name}: {modules}")
+        logger.info("Installing modules in %s: %s", db_name, modules)
 
         # Connect to the database as admin (password from settings/secret)
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
+
+        # Databases cloned from the template have nekazari_connector, which
+        # searches and installs in one call
+        if await self._has_connector(client):
+            module_ids = await client._execute(
+                "ir.module.module",
+                "nekazari_install_modules",
+                [modules],
+                {},
+                timeout=_NO_TIMEOUT
+            )
+            if module_ids:
+                logger.info("Modules installed: %s", modules)
+            else:
+                logger.info("All modules already installed or not found")
+            return
 
         # Find module IDs
-        module_ids = client.execute(
+        module_ids = await client.execute(
             "ir.module.module",
             "search",
             [["name", "in", modules], ["state", "!=", "installed"]]
@@ -176,28 +328,42 @@ class OdooClient:
 
         if module_ids:
             # Install modules
-            client.execute(
+            await client._execute(
                 "ir.module.module",
                 "button_immediate_install",
-                module_ids
+                [module_ids],
+                {},
+                timeout=_NO_TIMEOUT
             )
-            logger.info(f"Modules installed: {modules}")
+            logger.info("Modules installed: %s", modules)
         else:
             logger.info("All modules already installed or not found")
 
+    @staticmethod
+    async def _has_connector(client: "OdooClient") -> bool:
+        """Check (once per database) whether nekazari_connector is installed."""
+        installed = _connector_installed.get(client.database)
+        if installed is None:
+            installed = await client.execute(
+                "ir.module.module",
+                "search_count",
+                [["name", "=", "nekazari_connector"], ["state", "=", "installed"]]
+            ) > 0
+            _connector_installed[client.database] = installed
+        return installed
+
     async def get_installed_modules(self, db_name: str) -> list[str]:
         """Get list of installed modules in a database."""
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
 
-        module_ids = client.execute(
+        module_ids = await client.execute(
             "ir.module.module",
             "search_read",
             [["state", "=", "installed"]],
-            {"fields": ["name"]}
+            fields=["name"]
         )
 
-        return [m["name"] for m in module_ids]
+        return list(map(itemgetter("name"), module_ids))
 
     # User Management
 
@@ -220,10 +386,9 @@ class OdooClient:
         Returns:
             Created user ID
         """
-        logger.info(f"Creating user in {db_name}: {email}")
+        logger.info("Creating user in %s: %s", db_name, email)
 
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
 
         # Create user
         user_data = {
@@ -233,11 +398,11 @@ class OdooClient:
             "notification_type": "inbox"
         }
 
-        user_id = client.execute("res.users", "create", user_data)
+        user_id = await client.execute("res.users", "create", user_data)
 
         if is_admin:
             # Add to admin group
-            admin_group_id = client.execute(
+            admin_group_id = await client.execute(
                 "res.groups",
                 "search",
                 [["category_id.name", "=", "Administration"],
@@ -245,14 +410,14 @@ class OdooClient:
             )
 
             if admin_group_id:
-                client.execute(
+                await client.execute(
                     "res.users",
                     "write",
                     [user_id],
                     {"groups_id": [(4, admin_group_id[0])]}
                 )
 
-        logger.info(f"User created: {email} (ID: {user_id})")
+        logger.info("User created: %s (ID: %s)", email, user_id)
         return user_id
 
     # OAuth Provider Configuration
@@ -268,26 +433,25 @@ class OdooClient:
         Configure Keycloak OAuth provider in an Odoo database.
         Creates the provider if it doesn't exist. Returns provider ID.
         """
-        logger.info(f"Configuring OAuth provider in {db_name}")
+        logger.info("Configuring OAuth provider in %s", db_name)
 
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
 
         # Check if provider already exists
-        existing = client.execute(
+        existing = await client.execute(
             "auth.oauth.provider", "search_read",
             [["client_id", "=", client_id]],
-            {"fields": ["id"]}
+            fields=["id"]
         )
 
         if existing:
             provider_id = existing[0]["id"]
-            logger.info(f"OAuth provider already exists: ID {provider_id}")
+            logger.info("OAuth provider already exists: ID %s", provider_id)
             return provider_id
 
         base_url = f"{keycloak_public_url}/realms/{realm}/protocol/openid-connect"
 
-        provider_id = client.execute("auth.oauth.provider", "create", {
+        provider_id = await client.execute("auth.oauth.provider", "create", {
             "name": "Nekazari (Keycloak)",
             "flow": "access_token",
             "client_id": client_id,
@@ -301,18 +465,17 @@ class OdooClient:
             "sequence": 10,
         })
 
-        logger.info(f"OAuth provider created: ID {provider_id}")
+        logger.info("OAuth provider created: ID %s", provider_id)
         return provider_id
 
     async def get_oauth_provider_id(self, db_name: str, client_id: str) -> Optional[int]:
         """Get the OAuth provider ID for a given client_id, or None."""
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
 
-        existing = client.execute(
+        existing = await client.execute(
             "auth.oauth.provider", "search_read",
             [["client_id", "=", client_id]],
-            {"fields": ["id"]}
+            fields=["id"]
         )
 
         return existing[0]["id"] if existing else None
@@ -326,13 +489,25 @@ class OdooClient:
         values: dict
     ) -> int:
         """Create a record in Odoo."""
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
 
-        record_id = client.execute(model, "create", values)
-        logger.debug(f"Created {model} record: {record_id}")
+        record_id = await client.execute(model, "create", values)
+        logger.debug("Created %s record: %s", model, record_id)
         return record_id
 
+    async def create_records(
+        self,
+        db_name: str,
+        model: str,
+        values_list: list[dict]
+    ) -> list[int]:
+        """Create several records in Odoo with a single call."""
+        client = await OdooClient.get_shared(db_name)
+
+        record_ids = await client.execute(model, "create", values_list)
+        logger.debug("Created %s %s records", len(record_ids), model)
+        return record_ids
+
     async def update_record(
         self,
         db_name: str,
@@ -341,11 +516,23 @@ class OdooClient:
         values: dict
     ):
         """Update a record in Odoo."""
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
+
+        await client.execute(model, "write", [record_id], values)
+        logger.debug("Updated %s record: %s", model, record_id)
+
+    async def update_records(
+        self,
+        db_name: str,
+        model: str,
+        record_ids: list[int],
+        values: dict
+    ):
+        """Write the same values to several records in Odoo with a single call."""
+        client = await OdooClient.get_shared(db_name)
 
-        client.execute(model, "write", [record_id], values)
-        logger.debug(f"Updated {model} record: {record_id}")
+        await client.execute(model, "write", record_ids, values)
+        logger.debug("Updated %s %s records", len(record_ids), model)
 
     async def read_record(
         self,
@@ -355,18 +542,40 @@ class OdooClient:
         fields: Optional[list[str]] = None
     ) -> dict:
         """Read a record from Odoo."""
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        result = await self.read_records(db_name, model, [record_id], fields)
+        return result[0] if result else {}
+
+    async def read_records(
+        self,
+        db_name: str,
+        model: str,
+        record_ids: list[int],
+        fields: Optional[list[str]] = None
+    ) -> list[dict]:
+        """
+        Read several records from Odoo in one call.
+
+        Args:
+            db_name: Database name
+            model: Odoo model name
+            record_ids: IDs of the records to read
+            fields: Fields to read (all fields if None)
 
-        result = client.execute(
+        Returns:
+            Records that exist, in Odoo's read order
+        """
+        if not record_ids:
+            return []
+
+        client = await OdooClient.get_shared(db_name)
+
+        return await client.execute(
             model,
             "read",
-            [record_id],
-            {"fields": fields} if fields else {}
+            record_ids,
+            **({"fields": fields} if fields else {})
         )
 
-        return result[0] if result else {}
-
     async def search_records(
         self,
         db_name: str,
@@ -376,8 +585,7 @@ class OdooClient:
         limit: Optional[int] = None
     ) -> list[dict]:
         """Search records in Odoo."""
-        client = OdooClient(database=db_name)
-        client.authenticate("admin", settings.ODOO_ADMIN_PASSWORD or "admin")
+        client = await OdooClient.get_shared(db_name)
 
         kwargs = {}
         if fields:
@@ -385,4 +593,20 @@ class OdooClient:
         if limit:
             kwargs["limit"] = limit
 
-        return client.execute(model, "search_read", domain, kwargs)
+        return await client.execute(model, "search_read", domain, **kwargs)
+
+
+def get_odoo_client() -> OdooClient:
+    """Get or create the shared Odoo client."""
+    global _odoo_client
+    if _odoo_client is None:
+        _odoo_client = OdooClient()
+    return _odoo_client
+
+
+def _forget_database(db_name: str):
+    """Drop cached clients and UIDs for a database that no longer exists."""
+    _shared_clients.pop(db_name, None)
+    _connector_installed.pop(db_name, None)
+    for key in [key for key in _uid_cache if key[0] == db_name]:
+        _uid_cache.pop(key, None)
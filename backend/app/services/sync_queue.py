@@ -0,0 +1,206 @@
+"""
+Nekazari Odoo ERP Module - Sync Queue
+
+Background queue for NGSI-LD notification syncs. Entities are stored in
+the odoo_webhook_inbox table, then synced to Odoo by worker tasks, so the
+webhook can answer Orion-LD without waiting on Odoo.
+
+Each inbox item is leased by the replica syncing it. Failed items and
+items whose lease expired (e.g. their replica crashed) are picked up by a
+periodic scan on any replica.
+
+Author: Kate Benetis <kate@robotika.cloud>
+Company: Robotika
+License: AGPL-3.0
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Optional
+
+from app.config import settings
+from app.services.ngsi_sync import NgsildSyncService
+from app.services.database import (
+    add_webhook_inbox_items,
+    claim_webhook_inbox_items,
+    renew_webhook_inbox_claims,
+    release_webhook_inbox_claims,
+    delete_webhook_inbox_items,
+    mark_webhook_inbox_item_failed
+)
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process's claims on inbox items
+_OWNER = uuid.uuid4().hex
+
+# Queue of (inbox_id, tenant_id, entity) and the tasks draining/refilling it
+_queue: Optional[asyncio.Queue] = None
+_workers: list[asyncio.Task] = []
+
+# Inbox IDs in the queue or being synced, so a scan doesn't queue them twice
+_queued_ids: set[int] = set()
+
+# Max queued entities a worker takes at once (mappings are saved per batch)
+_BATCH_SIZE = 50
+
+# Max inbox items claimed per scan; the rest wait for the next scan
+_CLAIM_LIMIT = 1000
+
+# Tenants of one batch synced at the same time
+_TENANT_CONCURRENCY = 10
+
+
+async def _mark_failed(item_id: int, entity_id: Optional[str], tenant_id: str, error: BaseException):
+    """Log a failed sync and record it on the inbox item, never raising."""
+    logger.error("Failed to sync %s for tenant %s: %s", entity_id, tenant_id, error)
+    try:
+        await mark_webhook_inbox_item_failed(item_id, str(error))
+    except Exception as e:
+        # The claim expires and the item is retried after the lease
+        logger.error("Could not record failure of inbox item %s: %s", item_id, e)
+
+
+async def _process_batch(batch: list[tuple[int, str, dict]]):
+    """Sync a batch of entities to Odoo and settle their inbox rows."""
+    # Skip items another replica took over after our lease expired
+    owned = await renew_webhook_inbox_claims([item_id for item_id, _, _ in batch], _OWNER)
+
+    by_tenant: dict[str, list[tuple[int, dict]]] = {}
+    for item_id, tenant_id, entity in batch:
+        if item_id not in owned:
+            continue
+        if not isinstance(entity, dict):
+            # Stored before notifications were validated; never syncable
+            await _mark_failed(item_id, None, tenant_id, ValueError("Entity is not an object"))
+            continue
+        by_tenant.setdefault(tenant_id, []).append((item_id, entity))
+
+    # Tenants use different Odoo databases; overlap their round-trips
+    semaphore = asyncio.Semaphore(_TENANT_CONCURRENCY)
+    await asyncio.gather(*(
+        _process_tenant_items(tenant_id, items, semaphore)
+        for tenant_id, items in by_tenant.items()
+    ))
+
+
+async def _process_tenant_items(
+    tenant_id: str,
+    items: list[tuple[int, dict]],
+    semaphore: asyncio.Semaphore
+):
+    """Sync one tenant's entities from a batch and settle their inbox rows."""
+    async with semaphore:
+        try:
+            results = await NgsildSyncService(tenant_id).sync_entities_to_odoo(
+                [entity for _, entity in items]
+            )
+        except Exception as e:
+            # Saving the mappings failed; retry the whole batch later
+            results = [e] * len(items)
+
+    synced_ids = []
+    for (item_id, entity), error in zip(items, results):
+        if error is None:
+            synced_ids.append(item_id)
+        else:
+            await _mark_failed(item_id, entity.get("id"), tenant_id, error)
+
+    await delete_webhook_inbox_items(synced_ids)
+
+
+async def _worker(queue: asyncio.Queue):
+    """Pull batches of entities off the queue and sync them until cancelled."""
+    while True:
+        batch = [await queue.get()]
+        # Leave a fair share of the backlog to the other workers
+        limit = min(_BATCH_SIZE, 1 + queue.qsize() // settings.SYNC_WORKERS)
+        while len(batch) < limit and not queue.empty():
+            batch.append(queue.get_nowait())
+
+        try:
+            await _process_batch(batch)
+        except Exception as e:
+            # Inbox bookkeeping failed; the rows are retried once their lease expires
+            logger.error("Inbox update failed for %d items: %s", len(batch), e)
+        finally:
+            for item_id, _, _ in batch:
+                _queued_ids.discard(item_id)
+                queue.task_done()
+
+
+async def _recover(queue: asyncio.Queue):
+    """Periodically claim failed, abandoned and expired inbox items until cancelled."""
+    while True:
+        try:
+            # Don't claim more than the workers can start on within the lease
+            limit = _CLAIM_LIMIT - queue.qsize()
+            if limit > 0:
+                items = await claim_webhook_inbox_items(
+                    _OWNER,
+                    settings.SYNC_MAX_ATTEMPTS,
+                    settings.SYNC_LEASE_SECONDS,
+                    limit
+                )
+                for item in items:
+                    if item["id"] not in _queued_ids:
+                        _queued_ids.add(item["id"])
+                        queue.put_nowait((item["id"], item["tenant_id"], item["entity"]))
+                if items:
+                    logger.info("Claimed %d pending inbox items", len(items))
+        except Exception as e:
+            logger.error("Inbox scan failed: %s", e)
+
+        await asyncio.sleep(settings.SYNC_RETRY_INTERVAL)
+
+
+async def start_sync_workers():
+    """Create the queue and start the workers and the inbox scan."""
+    global _queue
+    _queue = asyncio.Queue()
+
+    for _ in range(settings.SYNC_WORKERS):
+        _workers.append(asyncio.create_task(_worker(_queue)))
+    _workers.append(asyncio.create_task(_recover(_queue)))
+    logger.info("Started %d sync workers", settings.SYNC_WORKERS)
+
+
+async def stop_sync_workers():
+    """Cancel the workers and release this process's unfinished items."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queued_ids.clear()
+
+    try:
+        await release_webhook_inbox_claims(_OWNER)
+    except Exception as e:
+        logger.warning("Could not release inbox claims: %s", e)
+
+
+async def enqueue_entities(tenant_id: str, entities: list[dict]) -> int:
+    """
+    Persist entities to the inbox and queue them for sync.
+
+    Args:
+        tenant_id: Tenant ID
+        entities: NGSI-LD entities from a notification
+
+    Returns:
+        Number of entities queued
+    """
+    if not entities:
+        return 0
+
+    item_ids = await add_webhook_inbox_items(tenant_id, entities, _OWNER)
+    if _queue is None:
+        # Workers not running; the items are claimed by a scan once the lease expires
+        logger.warning("Sync workers not started, %d items left in inbox", len(item_ids))
+        return len(item_ids)
+
+    _queued_ids.update(item_ids)
+    for item_id, entity in zip(item_ids, entities):
+        _queue.put_nowait((item_id, tenant_id, entity))
+    return len(item_ids)
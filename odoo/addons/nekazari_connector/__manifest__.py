@@ -43,6 +43,6 @@ For more information, visit: https://nekazari.com
     'application': False,
     'auto_install': False,
     'external_dependencies': {
-        'python': ['httpx'],
+        'python': ['httpx', 'orjson'],
     },
 }
@@ -9,13 +9,117 @@ Company: Robotika
 License: AGPL-3.0
 """
 
-import json
 import logging
-from odoo import http
+
+import orjson
+from odoo import http, fields
 from odoo.http import request
 
 _logger = logging.getLogger(__name__)
 
+_datetime_now = fields.Datetime.now
+
+# Map NGSI-LD types to Odoo models
+_TYPE_TO_MODEL = {
+    'AgriParcel': 'product.template',
+    'Device': 'maintenance.equipment',
+    'Building': 'res.partner',
+    'WeatherStation': 'maintenance.equipment'
+}
+
+# Models that can receive predictions, tried in order when the type is unknown
+_PREDICTION_MODELS = ('product.template', 'maintenance.equipment')
+
+
+def _val(prop):
+    """
+    Extract value from NGSI-LD property format.
+
+    Same rules as the backend's _unwrap_property: "value", then "@value",
+    and any other dict (e.g. a keyValues address) is passed through.
+    """
+    if type(prop) is dict:
+        # "value" is by far the common case; falsy values (0, False) are kept
+        try:
+            return prop['value']
+        except KeyError:
+            return prop.get('@value', prop)
+    return prop
+
+
+def _json_val(prop):
+    """Property value serialized as JSON (GeoJSON locations)."""
+    return orjson.dumps(_val(prop)).decode()
+
+
+# Returned by a converter to leave the Odoo field unset
+_SKIP = object()
+
+# Device types that have a matching selection value
+_DEVICE_TYPE_MAP = {
+    'Sensor': 'sensor',
+    'Actuator': 'actuator',
+    'Gateway': 'gateway',
+    'WeatherStation': 'weather_station'
+}
+
+_DEVICE_STATUSES = frozenset({'online', 'offline', 'maintenance', 'error'})
+
+
+def _device_type(prop):
+    """Map an NGSI-LD device type to the x_device_type selection."""
+    device_type = _val(prop)
+    if not isinstance(device_type, str):
+        return 'other'
+    return _DEVICE_TYPE_MAP.get(device_type, 'other')
+
+
+def _device_status(prop):
+    """Map an NGSI-LD status to x_status, skipping unknown values."""
+    status = _val(prop)
+    if not isinstance(status, str):
+        return _SKIP
+    status = status.lower()
+    return status if status in _DEVICE_STATUSES else _SKIP
+
+
+def _address_part(key):
+    """Converter for one field of an NGSI-LD address (skipped if not a dict)."""
+    def convert(prop):
+        address = _val(prop)
+        return address.get(key) if isinstance(address, dict) else _SKIP
+    return convert
+
+
+# (ngsi_key, odoo_key, converter) applied to every entity type
+_COMMON_TRANSFORMS = (
+    ('name', 'name', _val),
+)
+
+# (ngsi_key, odoo_key, converter) per NGSI-LD type
+_TRANSFORMS = {
+    'AgriParcel': (
+        ('area', 'x_area', _val),
+        ('cropType', 'x_crop_type', _val),
+        ('location', 'x_location', _json_val),
+        ('soilType', 'x_soil_type', _val),
+        ('description', 'description', _val),
+    ),
+    'Device': (
+        ('deviceType', 'x_device_type', _device_type),
+        ('status', 'x_status', _device_status),
+        ('serialNumber', 'serial_no', _val),
+        ('location', 'x_location', _json_val),
+    ),
+    'Building': (
+        ('address', 'street', _address_part('streetAddress')),
+        ('address', 'city', _address_part('addressLocality')),
+        ('address', 'zip', _address_part('postalCode')),
+        ('floorArea', 'x_floor_area', _val),
+        ('location', 'x_location', _json_val),
+    ),
+}
+
 
 class NekazariWebhookController(http.Controller):
     """Controller for Nekazari webhooks."""
@@ -38,6 +142,11 @@ class NekazariWebhookController(http.Controller):
             "entity_type": "AgriParcel",
             "data": {...}
         }
+
+        Bursts can be sent as one "sync.entity.batch" event with an
+        "entities" list of {"entity_id", "entity_type", "data"} objects,
+        or one "sync.prediction.batch" event with a "predictions" list of
+        {"entity_id", "data"} objects.
         """
         try:
             data = request.jsonrequest
@@ -51,8 +160,12 @@ class NekazariWebhookController(http.Controller):
 
             if event == 'sync.entity':
                 return self._handle_entity_sync(entity_id, entity_type, entity_data)
+            elif event == 'sync.entity.batch':
+                return self._handle_entity_sync_batch(data.get('entities') or [])
             elif event == 'sync.prediction':
                 return self._handle_prediction_sync(entity_id, entity_data)
+            elif event == 'sync.prediction.batch':
+                return self._handle_prediction_sync_batch(data.get('predictions') or [])
             else:
                 return {'status': 'ignored', 'reason': f'Unknown event: {event}'}
 
@@ -66,15 +179,7 @@ class NekazariWebhookController(http.Controller):
 
         Updates or creates the corresponding Odoo record.
         """
-        # Map NGSI-LD types to Odoo models
-        type_to_model = {
-            'AgriParcel': 'product.template',
-            'Device': 'maintenance.equipment',
-            'Building': 'res.partner',
-            'WeatherStation': 'maintenance.equipment'
-        }
-
-        model_name = type_to_model.get(entity_type)
+        model_name = _TYPE_TO_MODEL.get(entity_type)
         if not model_name:
             return {'status': 'ignored', 'reason': f'Unknown entity type: {entity_type}'}
 
@@ -87,7 +192,7 @@ class NekazariWebhookController(http.Controller):
         values = self._transform_ngsi_to_odoo(entity_type, data)
         values['x_ngsi_id'] = entity_id
         values['x_ngsi_type'] = entity_type
-        values['x_last_sync'] = fields.Datetime.now()
+        values['x_last_sync'] = _datetime_now()
 
         if record:
             record.write(values)
@@ -98,96 +203,181 @@ class NekazariWebhookController(http.Controller):
             _logger.info(f"Created {model_name} from NGSI-LD: {entity_id}")
             return {'status': 'created', 'odoo_id': record.id}
 
+    def _handle_entity_sync_batch(self, entities):
+        """
+        Handle a batch of entity syncs from NGSI-LD.
+
+        Looks up existing records with one search per model, creates new
+        ones with a single multi-record create, and writes records that
+        receive identical values together.
+        """
+        now = _datetime_now()
+        # Result per entity ID, or per position for invalid entries, and
+        # those keys in request order
+        results = {}
+        order = []
+
+        # model -> {entity_id: (entity_type, values)}; later duplicates win
+        by_model = {}
+        for index, entity in enumerate(entities):
+            if (
+                not isinstance(entity, dict)
+                or not isinstance(entity.get('entity_id'), str)
+                or not isinstance(entity.get('entity_type'), str)
+            ):
+                results[index] = {'status': 'ignored', 'reason': 'Invalid entity entry', 'index': index}
+                order.append(index)
+                continue
+
+            entity_id = entity['entity_id']
+            order.append(entity_id)
+            entity_type = entity['entity_type']
+            model_name = _TYPE_TO_MODEL.get(entity_type)
+            if not model_name:
+                results[entity_id] = {
+                    'status': 'ignored',
+                    'reason': f'Unknown entity type: {entity_type}',
+                    'entity_id': entity_id
+                }
+                continue
+
+            entity_data = entity.get('data')
+            values = self._transform_ngsi_to_odoo(
+                entity_type, entity_data if isinstance(entity_data, dict) else {}
+            )
+            values['x_ngsi_type'] = entity_type
+            values['x_last_sync'] = now
+            by_model.setdefault(model_name, {})[entity_id] = values
+
+        for model_name, entity_values in by_model.items():
+            Model = request.env[model_name].sudo()
+
+            existing = {
+                record.x_ngsi_id: record
+                for record in Model.search([('x_ngsi_id', 'in', list(entity_values))])
+            }
+
+            to_create = []
+            created_ids = []
+            to_write = {}
+            for entity_id, values in entity_values.items():
+                record = existing.get(entity_id)
+                if record:
+                    key = orjson.dumps(values, default=str, option=orjson.OPT_SORT_KEYS)
+                    to_write.setdefault(key, (values, []))[1].append((entity_id, record.id))
+                else:
+                    to_create.append(dict(values, x_ngsi_id=entity_id))
+                    created_ids.append(entity_id)
+
+            for values, targets in to_write.values():
+                Model.browse([record_id for _, record_id in targets]).write(values)
+                for entity_id, record_id in targets:
+                    results[entity_id] = {'status': 'updated', 'odoo_id': record_id, 'entity_id': entity_id}
+
+            if to_create:
+                # create() returns records in the order of its values
+                for entity_id, record in zip(created_ids, Model.create(to_create)):
+                    results[entity_id] = {'status': 'created', 'odoo_id': record.id, 'entity_id': entity_id}
+
+            _logger.info(
+                f"Synced {len(entity_values)} {model_name} records from NGSI-LD "
+                f"({len(to_create)} created)"
+            )
+
+        return {
+            'status': 'processed',
+            'results': [results[key] for key in dict.fromkeys(order)]
+        }
+
     def _handle_prediction_sync(self, entity_id, data):
         """
         Handle prediction sync from Intelligence module.
 
         Updates prediction fields on the entity.
         """
-        # Find record by NGSI-LD ID across all synced models
-        for model_name in ['product.template', 'maintenance.equipment']:
-            Model = request.env[model_name].sudo()
-            record = Model.search([('x_ngsi_id', '=', entity_id)], limit=1)
+        values = self._prediction_values(data)
+        resolved = self._resolve_entities([entity_id], self._prediction_models(entity_id))
 
-            if record:
-                values = {}
+        if entity_id not in resolved or not values:
+            return {'status': 'ignored', 'reason': 'Entity not found'}
 
-                if 'expected_yield' in data:
-                    values['x_predicted_yield'] = data['expected_yield']
-                if 'confidence' in data:
-                    values['x_yield_confidence'] = data['confidence']
+        model_name, record_id = resolved[entity_id]
+        request.env[model_name].sudo().browse(record_id).write(values)
+        _logger.info(f"Updated predictions for {entity_id}")
+        return {'status': 'updated', 'odoo_id': record_id}
 
-                if values:
-                    record.write(values)
-                    _logger.info(f"Updated predictions for {entity_id}")
-                    return {'status': 'updated', 'odoo_id': record.id}
+    def _handle_prediction_sync_batch(self, predictions):
+        """
+        Handle a batch of predictions from Intelligence module.
 
-        return {'status': 'ignored', 'reason': 'Entity not found'}
+        All target records are resolved with one search per model.
+        """
+        resolved = self._resolve_entities(
+            [prediction.get('entity_id') for prediction in predictions]
+        )
+
+        updated = 0
+        for prediction in predictions:
+            target = resolved.get(prediction.get('entity_id'))
+            values = self._prediction_values(prediction.get('data') or {})
+            if target and values:
+                model_name, record_id = target
+                request.env[model_name].sudo().browse(record_id).write(values)
+                updated += 1
+
+        _logger.info(f"Updated predictions for {updated} of {len(predictions)} entities")
+        return {'status': 'processed', 'updated': updated}
+
+    def _prediction_models(self, entity_id):
+        """
+        Models that may hold an entity's predictions.
 
-    def _transform_ngsi_to_odoo(self, entity_type, data):
-        """Transform NGSI-LD entity data to Odoo field values."""
-        values = {}
+        NGSI-LD IDs are urn:ngsi-ld:<Type>:<id>, so the type usually names
+        the one model to search; otherwise every prediction model is tried.
+        """
+        parts = (entity_id or '').split(':')
+        model_name = _TYPE_TO_MODEL.get(parts[2]) if len(parts) > 3 else None
+        return (model_name,) if model_name in _PREDICTION_MODELS else _PREDICTION_MODELS
 
-        # Common fields
-        if 'name' in data:
-            values['name'] = self._get_value(data['name'])
-
-        # Type-specific transformations
-        if entity_type == 'AgriParcel':
-            if 'area' in data:
-                values['x_area'] = self._get_value(data['area'])
-            if 'cropType' in data:
-                values['x_crop_type'] = self._get_value(data['cropType'])
-            if 'location' in data:
-                values['x_location'] = json.dumps(self._get_value(data['location']))
-            if 'soilType' in data:
-                values['x_soil_type'] = self._get_value(data['soilType'])
-            if 'description' in data:
-                values['description'] = self._get_value(data['description'])
-
-        elif entity_type == 'Device':
-            if 'deviceType' in data:
-                device_type = self._get_value(data['deviceType'])
-                # Map to selection value
-                type_map = {
-                    'Sensor': 'sensor',
-                    'Actuator': 'actuator',
-                    'Gateway': 'gateway',
-                    'WeatherStation': 'weather_station'
-                }
-                values['x_device_type'] = type_map.get(device_type, 'other')
-
-            if 'status' in data:
-                status = self._get_value(data['status']).lower()
-                if status in ['online', 'offline', 'maintenance', 'error']:
-                    values['x_status'] = status
-
-            if 'serialNumber' in data:
-                values['serial_no'] = self._get_value(data['serialNumber'])
-            if 'location' in data:
-                values['x_location'] = json.dumps(self._get_value(data['location']))
-
-        elif entity_type == 'Building':
-            if 'address' in data:
-                address = self._get_value(data['address'])
-                if isinstance(address, dict):
-                    values['street'] = address.get('streetAddress')
-                    values['city'] = address.get('addressLocality')
-                    values['zip'] = address.get('postalCode')
-
-            if 'floorArea' in data:
-                values['x_floor_area'] = self._get_value(data['floorArea'])
-            if 'location' in data:
-                values['x_location'] = json.dumps(self._get_value(data['location']))
+    def _resolve_entities(self, ngsi_ids, model_names=_PREDICTION_MODELS):
+        """
+        Find records by NGSI-LD ID with one search_read per model.
 
+        Returns:
+            {ngsi_id: (model_name, record_id)}, first model wins
+        """
+        resolved = {}
+        remaining = {ngsi_id for ngsi_id in ngsi_ids if ngsi_id}
+
+        for model_name in model_names:
+            if not remaining:
+                break
+            rows = request.env[model_name].sudo().search_read(
+                [('x_ngsi_id', 'in', list(remaining))], ['x_ngsi_id']
+            )
+            for row in rows:
+                resolved.setdefault(row['x_ngsi_id'], (model_name, row['id']))
+            remaining.difference_update(resolved)
+
+        return resolved
+
+    def _prediction_values(self, data):
+        """Odoo prediction field values from an Intelligence payload."""
+        values = {}
+        if 'expected_yield' in data:
+            values['x_predicted_yield'] = data['expected_yield']
+        if 'confidence' in data:
+            values['x_yield_confidence'] = data['confidence']
         return values
 
-    def _get_value(self, prop):
-        """Extract value from NGSI-LD property format."""
-        if isinstance(prop, dict):
-            return prop.get('value') or prop.get('@value')
-        return prop
+    def _transform_ngsi_to_odoo(self, entity_type, data):
+        """Transform NGSI-LD entity data to Odoo field values."""
+        values = {}
 
+        for ngsi_key, odoo_key, convert in _COMMON_TRANSFORMS + _TRANSFORMS.get(entity_type, ()):
+            if ngsi_key in data:
+                value = convert(data[ngsi_key])
+                if value is not _SKIP:
+                    values[odoo_key] = value
 
-# Import fields for datetime
-from odoo import fields
+        return values
@@ -7,7 +7,10 @@ Company: Robotika
 License: AGPL-3.0
 """
 
+from . import ngsi_mixin
 from . import product_template
 from . import maintenance_equipment
 from . import res_partner
 from . import nekazari_sync_log
+from . import ir_module_module
+from . import ir_config_parameter
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Nekazari Connector - System Parameter Extension
+
+Clears the cached Nekazari webhook URL when nekazari.* parameters change.
+
+Author: Kate Benetis <kate@robotika.cloud>
+Company: Robotika
+License: AGPL-3.0
+"""
+
+from odoo import models, api
+
+from .webhook_client import clear_webhook_url_cache
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if any(vals.get('key', '').startswith('nekazari.') for vals in vals_list):
+            clear_webhook_url_cache()
+        return records
+
+    def write(self, vals):
+        nekazari = any(key.startswith('nekazari.') for key in self.mapped('key'))
+        result = super().write(vals)
+        if nekazari or vals.get('key', '').startswith('nekazari.'):
+            clear_webhook_url_cache()
+        return result
+
+    def unlink(self):
+        nekazari = any(key.startswith('nekazari.') for key in self.mapped('key'))
+        result = super().unlink()
+        if nekazari:
+            clear_webhook_url_cache()
+        return result
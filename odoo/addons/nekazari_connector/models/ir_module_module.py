@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Nekazari Connector - Module Management Extension
+
+Lets the Nekazari backend install modules in a single RPC call during
+tenant provisioning.
+
+Author: Kate Benetis <kate@robotika.cloud>
+Company: Robotika
+License: AGPL-3.0
+"""
+
+from odoo import models, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class IrModuleModule(models.Model):
+    _inherit = 'ir.module.module'
+
+    @api.model
+    def nekazari_install_modules(self, module_names):
+        """
+        Install the named modules that are not installed yet.
+
+        Args:
+            module_names: Module technical names
+
+        Returns:
+            IDs of the modules that were installed
+        """
+        modules = self.search([('name', 'in', module_names), ('state', '!=', 'installed')])
+        if modules:
+            modules.button_immediate_install()
+            _logger.info(f"Nekazari installed modules: {modules.mapped('name')}")
+        return modules.ids
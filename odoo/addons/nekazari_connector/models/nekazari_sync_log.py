@@ -107,6 +107,23 @@ class NekazariSyncLog(models.Model):
             'end_date': fields.Datetime.now()
         })
 
+    @api.model
+    def log_sync_bulk(self, entries):
+        """
+        Create several sync log entries with a single multi-row insert.
+
+        Args:
+            entries: List of dicts with the same keys as log_sync arguments
+
+        Returns:
+            The created nekazari.sync.log records
+        """
+        end_date = fields.Datetime.now()
+        return self.create([
+            {'record_count': 0, 'state': 'done', 'duration': 0, **entry, 'end_date': end_date}
+            for entry in entries
+        ])
+
     def action_retry(self):
         """Retry a failed sync."""
         self.ensure_one()
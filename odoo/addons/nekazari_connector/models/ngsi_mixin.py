@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Nekazari Connector - NGSI-LD Sync Mixin
+
+Shared behaviour for models mirrored as NGSI-LD entities: the lookup
+index on x_ngsi_id/x_ngsi_type and the webhooks sent to Nekazari.
+
+Author: Kate Benetis <kate@robotika.cloud>
+Company: Robotika
+License: AGPL-3.0
+"""
+
+from odoo import models, api, tools
+import logging
+
+from .webhook_client import get_webhook_url, queue_webhook
+
+_logger = logging.getLogger(__name__)
+
+
+class NekazariNgsiMixin(models.AbstractModel):
+    """
+    Mixin for models with x_ngsi_id/x_ngsi_type fields.
+
+    Inheriting models define the fields themselves (types and defaults
+    differ per entity) and list the fields mirrored in NGSI-LD in
+    _NGSI_SYNCED_FIELDS. Models that leave it empty only get the index
+    and send no webhooks.
+    """
+    _name = 'nekazari.ngsi.mixin'
+    _description = 'Nekazari NGSI-LD Sync Mixin'
+
+    # Fields mirrored in NGSI-LD; writes to other fields send no webhook
+    _NGSI_SYNCED_FIELDS = frozenset()
+
+    def _auto_init(self):
+        """Index NGSI-LD lookups (partial: most records are not synced)."""
+        result = super()._auto_init()
+        if self._auto:
+            tools.create_index(
+                self._cr,
+                f'{self._table}_x_ngsi_id_type_index',
+                self._table,
+                ['x_ngsi_id', 'x_ngsi_type'],
+                where='x_ngsi_id IS NOT NULL'
+            )
+        return result
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Override create to trigger Nekazari sync."""
+        records = super().create(vals_list)
+        if self._NGSI_SYNCED_FIELDS:
+            records._trigger_nekazari_webhook('create')
+        return records
+
+    def write(self, vals):
+        """Override write to trigger Nekazari sync."""
+        result = super().write(vals)
+        if not self._NGSI_SYNCED_FIELDS.isdisjoint(vals):
+            self._trigger_nekazari_webhook('write')
+        return result
+
+    def _trigger_nekazari_webhook(self, event):
+        """
+        Trigger webhook to Nekazari backend.
+
+        Sends one request for all records with an NGSI-LD ID; a single
+        record keeps the flat record_id/ngsi_id payload. x_ngsi_id is
+        fetched for the whole recordset at once and paired with the ids
+        column, without building intermediate recordsets.
+        """
+        synced = [
+            (record_id, ngsi_id)
+            for record_id, ngsi_id in zip(self.ids, self.mapped('x_ngsi_id'))
+            if ngsi_id
+        ]
+        if not synced:
+            return
+
+        try:
+            webhook_url = get_webhook_url(self.env)
+
+            payload = {
+                'event': f'record.{event}',
+                'model': self._name,
+                'database': self.env.cr.dbname
+            }
+            if len(synced) == 1:
+                payload['record_id'], payload['ngsi_id'] = synced[0]
+            else:
+                payload['records'] = [
+                    {'id': record_id, 'ngsi_id': ngsi_id} for record_id, ngsi_id in synced
+                ]
+
+            # Sent after commit, from a background thread
+            queue_webhook(self.env, webhook_url, payload)
+
+            _logger.info(f"Nekazari webhook queued: {event} for {len(synced)} record(s)")
+
+        except Exception as e:
+            _logger.warning(f"Failed to queue Nekazari webhook: {e}")
@@ -9,14 +9,20 @@ Company: Robotika
 License: AGPL-3.0
 """
 
-from odoo import models, fields, api
+from odoo import models, fields
 import logging
 
 _logger = logging.getLogger(__name__)
 
 
 class ProductTemplate(models.Model):
-    _inherit = 'product.template'
+    _inherit = ['product.template', 'nekazari.ngsi.mixin']
+
+    # Fields mirrored in NGSI-LD (see nekazari.ngsi.mixin)
+    _NGSI_SYNCED_FIELDS = frozenset({
+        'name', 'description', 'x_ngsi_id', 'x_area', 'x_crop_type',
+        'x_location', 'x_soil_type'
+    })
 
     # NGSI-LD Integration Fields
     x_ngsi_id = fields.Char(
@@ -65,47 +71,3 @@ class ProductTemplate(models.Model):
         help='Confidence level of yield prediction (0-1)',
         readonly=True
     )
-
-    @api.model
-    def create(self, vals):
-        """Override create to trigger Nekazari sync."""
-        record = super().create(vals)
-        if record.x_ngsi_id:
-            record._trigger_nekazari_webhook('create')
-        return record
-
-    def write(self, vals):
-        """Override write to trigger Nekazari sync."""
-        result = super().write(vals)
-        for record in self:
-            if record.x_ngsi_id:
-                record._trigger_nekazari_webhook('write')
-        return result
-
-    def _trigger_nekazari_webhook(self, event):
-        """Trigger webhook to Nekazari backend."""
-        try:
-            # Get webhook URL from system parameters
-            webhook_url = self.env['ir.config_parameter'].sudo().get_param(
-                'nekazari.webhook_url',
-                'http://odoo-backend-service/api/odoo/webhook/odoo'
-            )
-
-            import httpx
-
-            payload = {
-                'event': f'record.{event}',
-                'model': 'product.template',
-                'record_id': self.id,
-                'database': self.env.cr.dbname,
-                'ngsi_id': self.x_ngsi_id
-            }
-
-            # Fire and forget (async would be better but this is simpler)
-            with httpx.Client(timeout=5.0) as client:
-                client.post(webhook_url, json=payload)
-
-            _logger.info(f"Nekazari webhook triggered: {event} for {self.x_ngsi_id}")
-
-        except Exception as e:
-            _logger.warning(f"Failed to trigger Nekazari webhook: {e}")
@@ -9,14 +9,14 @@ Company: Robotika
 License: AGPL-3.0
 """
 
-from odoo import models, fields, api
+from odoo import models, fields
 import logging
 
 _logger = logging.getLogger(__name__)
 
 
 class ResPartner(models.Model):
-    _inherit = 'res.partner'
+    _inherit = ['res.partner', 'nekazari.ngsi.mixin']
 
     # NGSI-LD Integration Fields
     x_ngsi_id = fields.Char(
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Nekazari Connector - Webhook HTTP Client
+
+Shared HTTP client for webhooks sent to the Nekazari backend, so record
+writes reuse keep-alive connections instead of opening one per webhook.
+Webhooks are queued on the transaction and, after commit, handed to an
+asyncio loop running in a background thread, so a slow backend never
+holds up an Odoo worker.
+
+Author: Kate Benetis <kate@robotika.cloud>
+Company: Robotika
+License: AGPL-3.0
+"""
+
+import asyncio
+import atexit
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+
+import httpx
+import orjson
+
+import odoo
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+# Background event loop of this process, and the client and semaphore
+# used on it (only touched from the loop's thread)
+_loop = None
+_loop_pid = None
+_client = None
+_semaphore = None
+_lock = threading.Lock()
+
+# Webhooks in flight per process
+_MAX_CONCURRENT_WEBHOOKS = 64
+
+# Shared with the backend (ODOO_WEBHOOK_SECRET), which rejects unsigned webhooks
+_WEBHOOK_SECRET = os.environ.get('NEKAZARI_WEBHOOK_SECRET', '').encode()
+if not _WEBHOOK_SECRET:
+    _logger.warning("NEKAZARI_WEBHOOK_SECRET not set; Nekazari webhooks are disabled")
+
+_DEFAULT_WEBHOOK_URL = 'http://odoo-backend-service/api/odoo/webhook/odoo'
+_WEBHOOK_URL_TTL = 60.0
+
+# Database name -> (webhook URL, expiry on the monotonic clock)
+_webhook_url_cache = {}
+
+
+def _get_loop():
+    """
+    Get or start the background event loop for this process.
+
+    Odoo forks its workers and threads do not survive a fork, so a new
+    loop (with its own client) is started after a fork.
+    """
+    global _loop, _loop_pid, _client, _semaphore
+    pid = os.getpid()
+    if _loop is None or _loop_pid != pid:
+        with _lock:
+            if _loop is None or _loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever,
+                    name='nekazari-webhooks',
+                    daemon=True
+                ).start()
+                _client = _semaphore = None
+                _loop, _loop_pid = loop, pid
+    return _loop
+
+
+def _get_client():
+    """Get or create the async webhook client (on the loop's thread)."""
+    global _client, _semaphore
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=5.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            headers={'Content-Type': 'application/json'}
+        )
+        _semaphore = asyncio.Semaphore(_MAX_CONCURRENT_WEBHOOKS)
+    return _client
+
+
+def _close_client():
+    """Close this process's client on interpreter exit."""
+    if _client is not None and _loop_pid == os.getpid() and _loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(_client.aclose(), _loop).result(timeout=1)
+        except Exception:
+            pass
+
+
+atexit.register(_close_client)
+
+
+def get_webhook_url(env):
+    """
+    Get the nekazari.webhook_url system parameter for env's database.
+
+    Cached per worker for a minute; writes to nekazari.* parameters clear
+    the cache in the worker that made them.
+    """
+    dbname = env.cr.dbname
+    now = time.monotonic()
+    cached = _webhook_url_cache.get(dbname)
+    if cached is not None and now < cached[1]:
+        return cached[0]
+    webhook_url = env['ir.config_parameter'].sudo().get_param(
+        'nekazari.webhook_url', _DEFAULT_WEBHOOK_URL
+    )
+    _webhook_url_cache[dbname] = (webhook_url, now + _WEBHOOK_URL_TTL)
+    return webhook_url
+
+
+def clear_webhook_url_cache():
+    """Forget cached webhook URLs in this worker."""
+    _webhook_url_cache.clear()
+
+
+def queue_webhook(env, webhook_url, payload):
+    """
+    Queue a webhook to be sent once the current transaction commits.
+
+    Nothing is sent if the transaction rolls back. The payload is
+    serialized once here, and a payload identical to one already queued
+    in the transaction (e.g. repeated writes to a record) is sent once.
+
+    Args:
+        env: Odoo environment of the transaction
+        webhook_url: Nekazari backend webhook URL
+        payload: JSON payload
+    """
+    if not _WEBHOOK_SECRET:
+        # The backend would reject the webhook; don't send (or log) it
+        return
+
+    postcommit = env.cr.postcommit
+    queue = postcommit.data.get('nekazari.webhooks')
+    if queue is None:
+        # (url, serialized payload) -> payload, in queueing order
+        queue = postcommit.data['nekazari.webhooks'] = {}
+        dbname = env.cr.dbname
+        postcommit.add(lambda: _flush_in_background(dbname, queue))
+    queue.setdefault((webhook_url, orjson.dumps(payload)), payload)
+
+
+def _flush_in_background(dbname, queue):
+    """Hand queued webhooks to the background loop; returns immediately."""
+    asyncio.run_coroutine_threadsafe(_flush(dbname, list(queue.items())), _get_loop())
+
+
+async def _flush(dbname, queue):
+    """Send queued webhooks concurrently, logging failures as sync log errors."""
+    results = await asyncio.gather(
+        *(_post(webhook_url, body) for (webhook_url, body), _payload in queue),
+        return_exceptions=True
+    )
+    failures = []
+    for ((_key, payload), result) in zip(queue, results):
+        if isinstance(result, Exception):
+            _logger.warning(f"Failed to send Nekazari webhook: {result}")
+            failures.append((payload, result))
+    if failures:
+        # Logging needs a database cursor; keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, _log_failures, dbname, failures)
+
+
+async def _post(webhook_url, body):
+    """POST one webhook, bounded by the per-process concurrency limit."""
+    client = _get_client()
+    signature = hmac.new(_WEBHOOK_SECRET, body, hashlib.sha256).hexdigest()
+    async with _semaphore:
+        response = await client.post(
+            webhook_url,
+            content=body,
+            headers={'X-Nekazari-Signature': f'sha256={signature}'}
+        )
+    response.raise_for_status()
+
+
+def _log_failures(dbname, failures):
+    """Record failed webhooks in nekazari.sync.log in one insert."""
+    entries = []
+    for payload, error in failures:
+        records = payload.get('records')
+        entries.append({
+            'sync_type': 'webhook',
+            'direction': 'odoo_to_ngsi',
+            'model': payload.get('model'),
+            'record_count': len(records) if records else 1,
+            'state': 'error',
+            'error_message': str(error)
+        })
+    try:
+        with odoo.registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['nekazari.sync.log'].log_sync_bulk(entries)
+    except Exception as e:
+        _logger.warning(f"Failed to log Nekazari webhook errors: {e}")